@@ -0,0 +1,111 @@
+"""Disk space and write time saved by content-addressed upload storage.
+
+Uploads a set of distinct files, each several times, through the same path
+as the upload page: hash_source() on the in-memory buffer, then
+BlobStore.store() with the videos insert in its transaction. The baseline
+writes every upload as its own file with write_file(), as uploads were
+stored before. Reports logical bytes, bytes on disk (allocated blocks) and
+wall time for both, then deletes everything through BlobStore.release()
+and checks nothing is left behind.
+
+Usage: python benchmarks/blob_dedup.py [--distinct 10] [--copies 3] [--size-mb 8]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import StorageEngine  # noqa: E402
+from migrations import migrate_storage  # noqa: E402
+from video_storage import BlobStore, hash_source, write_file  # noqa: E402
+
+
+def disk_usage(root):
+    """Bytes allocated to the files under root"""
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            total += os.stat(os.path.join(directory, name)).st_blocks * 512
+    return total
+
+
+def uploads(distinct, copies, size):
+    """(name, buffer) pairs: every distinct payload repeated copies times"""
+    payloads = [os.urandom(size) for _ in range(distinct)]
+    return [
+        (f"video-{index}-{copy}.mp4", io.BytesIO(payload))
+        for copy in range(copies) for index, payload in enumerate(payloads)
+    ]
+
+
+def store_plain(root, files):
+    for number, (name, source) in enumerate(files):
+        write_file(source, os.path.join(root, f"{number}_{name}"))
+
+
+def store_blobs(storage, blobs, files):
+    def insert_video(conn, file_path):
+        conn.execute(
+            "INSERT INTO videos (user_id, filename, original_name, file_path, file_size, checksum) "
+            "VALUES (1, ?, ?, ?, ?, ?)",
+            (os.path.basename(file_path), name, file_path, size, checksum)
+        )
+
+    for name, source in files:
+        checksum, size = hash_source(source)
+        blobs.store(source, name, checksum, size, insert_video)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--distinct', type=int, default=10)
+    parser.add_argument('--copies', type=int, default=3)
+    parser.add_argument('--size-mb', type=float, default=8.0)
+    args = parser.parse_args()
+    size = int(args.size_mb * 1024 * 1024)
+    files = uploads(args.distinct, args.copies, size)
+    logical = size * len(files)
+
+    with tempfile.TemporaryDirectory() as directory:
+        plain_root = os.path.join(directory, 'plain')
+        os.makedirs(plain_root)
+        started = time.perf_counter()
+        store_plain(plain_root, files)
+        plain_seconds = time.perf_counter() - started
+        plain_disk = disk_usage(plain_root)
+
+        storage = StorageEngine(os.path.join(directory, 'bench.db'))
+        migrate_storage(storage)
+        storage.execute(
+            "INSERT INTO users (username, email, password_hash) VALUES ('bench', 'bench@example.com', 'x')"
+        )
+        blobs = BlobStore(storage, os.path.join(directory, 'blobs'))
+        started = time.perf_counter()
+        store_blobs(storage, blobs, files)
+        blob_seconds = time.perf_counter() - started
+        blob_disk = disk_usage(blobs.root)
+        stats = blobs.stats()
+
+        print(f"{len(files)} uploads: {args.distinct} distinct files x {args.copies}, {args.size_mb:g} MB each")
+        print(f"  logical size     {logical / 2**20:10.1f} MB")
+        print(f"  one file each    {plain_disk / 2**20:10.1f} MB on disk  {plain_seconds:6.2f} s")
+        print(f"  BlobStore        {blob_disk / 2**20:10.1f} MB on disk  {blob_seconds:6.2f} s")
+        print(f"  saved            {(plain_disk - blob_disk) / 2**20:10.1f} MB "
+              f"({1 - blob_disk / plain_disk:.0%}); stats() reports "
+              f"{(stats['logical_bytes'] - stats['stored_bytes']) / 2**20:.1f} MB")
+
+        for video_id, file_path, checksum in storage.fetchall("SELECT id, file_path, checksum FROM videos"):
+            blobs.release(checksum, file_path, lambda conn, video_id=video_id: conn.execute(
+                "DELETE FROM videos WHERE id = ?", (video_id,)
+            ).rowcount > 0)
+        left = disk_usage(blobs.root)
+        print(f"  after deleting every video: {left} bytes on disk, {blobs.stats()['blobs']} blobs")
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
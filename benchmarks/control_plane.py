@@ -0,0 +1,100 @@
+"""Cost of supervising many ffmpeg processes: threads, CPU and memory.
+
+Launches N streams through StreamSupervisor on a StreamingEngine whose
+ffmpeg is a small shell script that prints a -progress block every half
+second, like a live encoder, and exits on 'q' or a signal. Reports the time
+to start them all, the threads of this process, its CPU time (user + sys)
+over a steady window, its RSS, and the time stop_all() takes.
+
+--tree runs the same measurement against another checkout, so an older
+engine can be compared with the current one:
+
+    git worktree add /tmp/streamflow-old <commit>
+    python benchmarks/control_plane.py --tree /tmp/streamflow-old
+
+Usage: python benchmarks/control_plane.py [--streams 300] [--seconds 10] [--tree PATH]
+"""
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Background reader: stdin is saved on fd 3 first because an asynchronous
+# list in sh gets /dev/null as its stdin
+FAKE_ENCODER = """#!/bin/sh
+exec 3<&0
+{ c=$(head -c 1 <&3); [ "$c" = q ] && kill $$; } >/dev/null 2>&1 &
+i=0
+while true; do
+    i=$((i+1))
+    printf "frame=%d\\nfps=30\\nbitrate=2500.0kbits/s\\nout_time_us=%d000000\\nspeed=1x\\nprogress=continue\\n" $((i*15)) $i
+    sleep 0.5
+done
+"""
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--streams', type=int, default=300)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--tree', default=REPO_ROOT, help="checkout whose engine is measured")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.tree))
+    from streaming_engine import StreamingEngine
+    from supervisor import StreamSupervisor
+
+    with tempfile.TemporaryDirectory() as directory:
+        ffmpeg = os.path.join(directory, 'ffmpeg')
+        with open(ffmpeg, 'w') as f:
+            f.write(FAKE_ENCODER)
+        os.chmod(ffmpeg, os.stat(ffmpeg).st_mode | stat.S_IXUSR)
+        input_path = os.path.join(directory, 'input.mp4')
+        with open(input_path, 'wb') as f:
+            f.write(b'\0' * 1024)
+
+        engine = StreamingEngine(ffmpeg)
+        supervisor = StreamSupervisor(engine, lambda *args, **kwargs: True)
+        baseline_threads = threading.active_count()
+
+        started = time.perf_counter()
+        for key in range(args.streams):
+            supervisor.launch(key, input_path, f"rtmp://127.0.0.1/live/{key}")
+        start_seconds = time.perf_counter() - started
+
+        # Let every process print its first blocks before measuring
+        time.sleep(1.0)
+        before = os.times()
+        time.sleep(args.seconds)
+        after = os.times()
+        cpu = (after.user - before.user) + (after.system - before.system)
+        threads = threading.active_count()
+        rss = rss_mb()
+
+        started = time.perf_counter()
+        engine.stop_all()
+        stop_seconds = time.perf_counter() - started
+
+    print(f"{args.streams} supervised encoders, tree {os.path.abspath(args.tree)}")
+    print(f"  start all        {start_seconds:8.2f} s")
+    print(f"  threads          {threads:8d} (before launching: {baseline_threads})")
+    print(f"  control CPU      {cpu / args.seconds:8.1%} of one core over {args.seconds:g} s")
+    print(f"  RSS              {rss:8.1f} MB")
+    print(f"  stop_all         {stop_seconds:8.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Memory per row of the slotted record types against plain dicts and tuples.
+
+Loads the same streams rows from a migrated temporary database three ways
+(tuples as sqlite3 returns them, dicts keyed by column as the session-state
+apps used to keep them, and records.Stream through its row factory) and
+reports the bytes tracemalloc attributes to each list, per row. The second
+table builds dicts and records from rows already in memory, so it shows the
+container alone, without the column values.
+
+Usage: python benchmarks/records_memory.py [--rows 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import StorageEngine  # noqa: E402
+from migrations import migrate_storage  # noqa: E402
+from records import Stream  # noqa: E402
+
+STREAM_COLUMNS = "id, user_id, title, platform, stream_key, video_id, status, scheduled_time, created_at"
+
+
+def dict_factory(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def allocated_by(build):
+    """(bytes tracemalloc sees allocated and still held by build(), its result)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = build()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, 'filename')), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = StorageEngine(os.path.join(directory, 'bench.db'))
+        migrate_storage(storage)
+        with storage.writer() as conn:
+            conn.execute(
+                "INSERT INTO users (username, email, password_hash) VALUES ('bench', 'bench@example.com', 'x')"
+            )
+            conn.executemany(
+                "INSERT INTO streams (user_id, title, platform, stream_key, status, scheduled_time) "
+                "VALUES (1, ?, 'YouTube', ?, 'inactive', '2026-01-01 12:00:00')",
+                ((f"Stream {i}", f"key-{i:08d}") for i in range(args.rows))
+            )
+        sql = f"SELECT {STREAM_COLUMNS} FROM streams"
+        names = [name.strip() for name in STREAM_COLUMNS.split(',')]
+
+        print(f"{args.rows} streams rows, {len(names)} columns")
+        print("fetchall, values included:")
+        for label, row_factory in (('tuple', None), ('dict', dict_factory), ('Stream (slots)', Stream.row_factory)):
+            allocated, rows = allocated_by(lambda: storage.fetchall(sql, (), row_factory))
+            print(f"  {label:<16} {allocated / len(rows):8.0f} bytes/row")
+
+        # Timestamps stay strings here, so both containers hold the same objects
+        values = storage.fetchall(sql)
+        print("container only, built from fetched values:")
+        for label, build in (
+            ('dict', lambda: [dict(zip(names, row)) for row in values]),
+            ('Stream (slots)', lambda: [Stream(**dict(zip(names, row))) for row in values]),
+        ):
+            allocated, rows = allocated_by(build)
+            print(f"  {label:<16} {allocated / len(rows):8.0f} bytes/row")
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
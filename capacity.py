@@ -0,0 +1,205 @@
+import os
+import statistics
+import threading
+import time
+
+from media_probe import parse_resolution
+from streaming_engine import StreamError
+
+# Share of the host's cores live streams may use; the rest is left for the
+# app itself, SQLite and rendition jobs
+HOST_CPU_SHARE = float(os.environ.get('STREAMFLOW_CPU_SHARE', '0.8'))
+MAX_STREAMS_PER_USER = int(os.environ.get('STREAMFLOW_MAX_STREAMS_PER_USER', '5'))
+# Estimates until a cost class has been measured: a stream copy, and cores
+# per million pixels per second of live libx264 (720p30 is ~1.1 cores)
+DEFAULT_COPY_CORES = 0.05
+DEFAULT_TRANSCODE_CORES_PER_MPX = 0.04
+# Seconds between CPU samples of the running encoders
+SAMPLE_INTERVAL = 15.0
+# Weight of the newest sample in a cost class's moving average
+SAMPLE_WEIGHT = 0.2
+# A live output slower than this means the host is already overloaded
+MIN_SPEED = 0.95
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+class CapacityError(StreamError):
+    """A start was refused because the host or the user is at its budget.
+
+    scope is 'host' or 'user', so a queue can skip past a user who is at
+    their limit without letting anyone overtake a host-wide wait.
+    """
+
+    def __init__(self, message, scope):
+        super().__init__(message)
+        self.scope = scope
+
+
+def cost_class(options):
+    """What a stream's CPU cost depends on: copy, or transcode size and fps"""
+    if options.get('mode') != 'transcode':
+        return 'copy'
+    return f"transcode {options.get('resolution')}@{options.get('fps')}"
+
+
+def _process_cpu_seconds(pid):
+    """utime + stime of a process from /proc, or None where unavailable"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            fields = f.read().rsplit(b')', 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    # Fields 14 and 15 of stat(5), counted after the ")" closing the name
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+
+
+class CapacityPlanner:
+    """Admission control for ffmpeg outputs, sized from measured CPU cost.
+
+    Every running output holds a reservation in cores for its cost class.
+    The cost of a class is a moving average of what its encoders actually
+    used, sampled from /proc and kept in stream_costs across restarts;
+    a transcode class not seen yet is scaled from the measured per-pixel
+    cost of the others. admit() refuses a start that would push the
+    reservations over HOST_CPU_SHARE of the cores, exceed the user's
+    MAX_STREAMS_PER_USER, or join a host where live outputs already fall
+    behind real time.
+    """
+
+    def __init__(self, storage, engine, cpu_count=None):
+        self.storage = storage
+        self.engine = engine
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self._costs = dict(storage.fetchall("SELECT cost_class, cores FROM stream_costs"))
+        self._reserved = {}
+        self._cpu_seen = {}
+        self._lock = threading.Lock()
+
+    @property
+    def budget(self):
+        return self.cpu_count * HOST_CPU_SHARE
+
+    def estimate(self, cost):
+        """Expected cores for a cost class"""
+        with self._lock:
+            return self._estimate_locked(cost)
+
+    def _estimate_locked(self, cost):
+        if cost in self._costs:
+            return self._costs[cost]
+        if cost == 'copy':
+            return DEFAULT_COPY_CORES
+        per_mpx = [
+            cores / mpx for cores, mpx in (
+                (cores, self._megapixels_per_second(measured)) for measured, cores in self._costs.items()
+            ) if mpx
+        ]
+        rate = statistics.median(per_mpx) if per_mpx else DEFAULT_TRANSCODE_CORES_PER_MPX
+        return rate * self._megapixels_per_second(cost)
+
+    @staticmethod
+    def _megapixels_per_second(cost):
+        if not cost.startswith('transcode '):
+            return 0.0
+        resolution, _, fps = cost.split(' ', 1)[1].partition('@')
+        size = parse_resolution(resolution)
+        try:
+            return size[0] * size[1] * float(fps) / 1e6 if size else 0.0
+        except ValueError:
+            return 0.0
+
+    def admit(self, key, user_id, cost):
+        """Reserve capacity for an output, or raise CapacityError with the reason.
+
+        Returns False when the key already held a reservation, so a caller
+        that fails to start only gives back what it reserved itself.
+        """
+        with self._lock:
+            if key in self._reserved:
+                return False
+            user_streams = sum(1 for owner, _, _ in self._reserved.values() if owner == user_id)
+            if user_streams >= MAX_STREAMS_PER_USER:
+                raise CapacityError(
+                    f"Batas {MAX_STREAMS_PER_USER} stream aktif per pengguna sudah tercapai", 'user'
+                )
+            cores = self._estimate_locked(cost)
+            used = sum(reserved for _, _, reserved in self._reserved.values())
+            # The first output always fits, whatever the estimate says
+            if self._reserved and used + cores > self.budget:
+                raise CapacityError(
+                    f"Kapasitas server tidak cukup: stream ini butuh ±{cores:.1f} core CPU, "
+                    f"tersisa {max(0.0, self.budget - used):.1f} dari {self.budget:.1f}", 'host'
+                )
+            if self._reserved and cost != 'copy' and self._lagging():
+                raise CapacityError("Server sedang penuh: stream yang berjalan sudah tidak real-time", 'host')
+            self._reserved[key] = (user_id, cost, cores)
+            return True
+
+    def reserve(self, key, user_id, cost):
+        """Account for an output that is already running, without any checks"""
+        with self._lock:
+            self._reserved[key] = (user_id, cost, self._estimate_locked(cost))
+
+    def release(self, key):
+        with self._lock:
+            self._reserved.pop(key, None)
+
+    def _lagging(self):
+        for handle in self.engine.handles():
+            latest = handle.metrics.latest()
+            # The first seconds of a run are often below speed 1
+            if latest is None or time.time() - handle.started_at < SAMPLE_INTERVAL:
+                continue
+            if latest['speed'] < MIN_SPEED:
+                return True
+        return False
+
+    def sample(self):
+        """Measure the running encoders and fold their CPU use into the cost history"""
+        now = time.monotonic()
+        measured = {}
+        seen = {}
+        for handle in self.engine.handles():
+            cpu = _process_cpu_seconds(handle.pid)
+            if cpu is None:
+                continue
+            seen[handle.pid] = (now, cpu)
+            previous = self._cpu_seen.get(handle.pid)
+            with self._lock:
+                reservation = self._reserved.get(handle.stream_id)
+            if previous is None or reservation is None or now <= previous[0]:
+                continue
+            measured.setdefault(reservation[1], []).append((cpu - previous[1]) / (now - previous[0]))
+        self._cpu_seen = seen
+        if not measured:
+            return
+        rows = []
+        with self._lock:
+            for cost, samples in measured.items():
+                cores = statistics.mean(samples)
+                if cost in self._costs:
+                    cores = (1 - SAMPLE_WEIGHT) * self._costs[cost] + SAMPLE_WEIGHT * cores
+                self._costs[cost] = cores
+                rows.append((cost, cores))
+            # Reservations follow what their class is measured to cost
+            for key, (user_id, cost, _) in self._reserved.items():
+                if cost in measured:
+                    self._reserved[key] = (user_id, cost, self._costs[cost])
+        with self.storage.writer() as conn:
+            conn.executemany(
+                "INSERT INTO stream_costs (cost_class, cores, samples, updated_at) "
+                "VALUES (?, ?, 1, CURRENT_TIMESTAMP) ON CONFLICT (cost_class) DO UPDATE SET "
+                "cores = excluded.cores, samples = samples + 1, updated_at = excluded.updated_at",
+                rows
+            )
+
+    def stats(self):
+        """Budget and current reservations, for the settings page"""
+        with self._lock:
+            return {
+                'budget': self.budget,
+                'used': sum(cores for _, _, cores in self._reserved.values()),
+                'outputs': len(self._reserved),
+                'costs': dict(self._costs),
+            }
@@ -0,0 +1,96 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# On-disk database shared by every Streamlit session in this process
+DEFAULT_DB_PATH = os.environ.get(
+    'STREAMFLOW_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', 'streamlit.db')
+)
+DEFAULT_READERS = int(os.environ.get('STREAMFLOW_DB_READERS', '4'))
+
+
+class StorageEngine:
+    """Process-wide SQLite store with a reader pool and a single serialized writer.
+
+    The database runs in WAL mode, so readers see the last committed snapshot
+    and never wait for the writer. All writes go through one connection guarded
+    by a lock, which keeps SQLite from returning SQLITE_BUSY under load.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, readers=DEFAULT_READERS, timeout=30.0):
+        if path == ':memory:':
+            raise ValueError("StorageEngine needs a file path; ':memory:' cannot be shared between connections")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.timeout = timeout
+        self._writer_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._readers = queue.LifoQueue()
+        for _ in range(max(1, readers)):
+            self._readers.put(self._connect(readonly=True))
+
+    def _connect(self, readonly=False):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection from the pool"""
+        try:
+            conn = self._readers.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database reader") from None
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """Hold the writer connection for one transaction"""
+        with self._writer_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+    def fetchone(self, sql, params=(), row_factory=None):
+        with self.reader() as conn:
+            return self._cursor(conn, row_factory).execute(sql, params).fetchone()
+
+    def fetchall(self, sql, params=(), row_factory=None):
+        with self.reader() as conn:
+            return self._cursor(conn, row_factory).execute(sql, params).fetchall()
+
+    @staticmethod
+    def _cursor(conn, row_factory):
+        # Set per cursor: pooled connections are shared between callers
+        cursor = conn.cursor()
+        if row_factory is not None:
+            cursor.row_factory = row_factory
+        return cursor
+
+    def execute(self, sql, params=()):
+        with self.writer() as conn:
+            return conn.execute(sql, params)
+
+    def close(self):
+        with self._writer_lock:
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,33 @@
+import threading
+import time
+
+# Low bits of an id hold a per-millisecond sequence number
+SEQUENCE_BITS = 16
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+
+class IdAllocator:
+    """Time-ordered integer ids shared by every record type.
+
+    An id is the creation time in milliseconds shifted left by SEQUENCE_BITS,
+    plus a sequence number for ids issued in the same millisecond. Ids are
+    unique and strictly increasing even if the wall clock steps backwards,
+    so they never repeat after a delete and sort in creation order without
+    parsing created_at.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        candidate = int(self._clock() * 1000) << SEQUENCE_BITS
+        with self._lock:
+            self._last = max(candidate, self._last + 1)
+            return self._last
+
+    @staticmethod
+    def created_at(record_id):
+        """Creation time encoded in an id, as a POSIX timestamp"""
+        return (record_id >> SEQUENCE_BITS) / 1000
@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+
+from records import Job
+
+# Worker threads; each job drives its own ffmpeg process
+DEFAULT_WORKERS = int(os.environ.get('STREAMFLOW_JOB_WORKERS', '0')) or os.cpu_count() or 1
+DEFAULT_MAX_ATTEMPTS = 3
+# First retry delay in seconds, doubled on every further attempt
+RETRY_BACKOFF = 10
+POLL_INTERVAL = 5.0
+# Seconds between progress writes for one job
+PROGRESS_INTERVAL = 1.0
+# Jobs run earliest deadline first; ones without a deadline go last
+PRIORITY_BACKGROUND = 2 ** 62
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled"""
+
+
+class RunningJob:
+    """What a handler gets: the job row, its payload and progress reporting"""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.job = job
+        self.payload = json.loads(job.payload) if job.payload else {}
+        self.cancel_event = threading.Event()
+        self._reported_at = 0.0
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def report(self, fraction):
+        """Record progress (0..1), at most once per PROGRESS_INTERVAL"""
+        now = time.monotonic()
+        if now - self._reported_at < PROGRESS_INTERVAL:
+            return
+        self._reported_at = now
+        self.queue.storage.execute(
+            "UPDATE jobs SET progress = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+            (max(0.0, min(1.0, fraction)), self.job.id)
+        )
+
+
+class JobQueue:
+    """Persistent background job queue backed by the jobs table.
+
+    Jobs survive restarts: rows left 'running' by a dead process are queued
+    again on start(). A pool of worker threads claims the queued job with
+    the lowest priority value (an epoch-seconds deadline) in one UPDATE, so
+    work never runs in the Streamlit script thread. Failures are retried
+    with exponential backoff up to max_attempts, and queued or running
+    jobs can be cancelled.
+    """
+
+    def __init__(self, storage, workers=DEFAULT_WORKERS, poll_interval=POLL_INTERVAL):
+        self.storage = storage
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._cancel_hooks = {}
+        self._running = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+
+    def register(self, kind, handler, on_cancel=None):
+        """handler(running_job) runs one job of this kind; raising fails it.
+
+        Workers only claim kinds with a handler, so jobs queued before their
+        handler is registered simply wait. on_cancel(payload) is called for
+        a job cancelled before it started; a running one sees its
+        cancel_event instead.
+        """
+        self._handlers[kind] = handler
+        if on_cancel is not None:
+            self._cancel_hooks[kind] = on_cancel
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def start(self):
+        with self.storage.writer() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        with self._lock:
+            for running in self._running.values():
+                running.cancel_event.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def submit(self, kind, payload=None, ref=None, priority=PRIORITY_BACKGROUND, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Queue a job; ref groups jobs for lookups and prioritize()"""
+        job_id = self.storage.execute(
+            "INSERT INTO jobs (kind, payload, ref, priority, max_attempts) VALUES (?, ?, ?, ?, ?)",
+            (kind, json.dumps(payload or {}), ref, priority, max_attempts)
+        ).lastrowid
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def prioritize(self, ref, priority):
+        """Move queued jobs for ref forward to at least this priority"""
+        self.storage.execute(
+            "UPDATE jobs SET priority = MIN(priority, ?) WHERE ref = ? AND status = 'queued'",
+            (priority, ref)
+        )
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it already finished"""
+        # Read and updated under the writer lock, which _claim also takes,
+        # so a queued job cannot be claimed in between
+        with self.storage.writer() as conn:
+            row = conn.execute(
+                "SELECT kind, payload, status FROM jobs WHERE id = ? AND status IN ('queued', 'running')",
+                (job_id,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (job_id,)
+                )
+        if row is None:
+            return False
+        kind, payload, status = row
+        if status == 'queued':
+            on_cancel = self._cancel_hooks.get(kind)
+            if on_cancel is not None:
+                on_cancel(json.loads(payload) if payload else {})
+        with self._lock:
+            running = self._running.get(job_id)
+        if running is not None:
+            running.cancel_event.set()
+        return True
+
+    def jobs_for_refs(self, refs, statuses=('queued', 'running', 'failed')):
+        """Jobs of a page of refs, newest first, in one query"""
+        refs = [ref for ref in refs if ref]
+        if not refs:
+            return []
+        return self.storage.fetchall(
+            f"SELECT * FROM jobs WHERE ref IN ({', '.join('?' * len(refs))}) "
+            f"AND status IN ({', '.join('?' * len(statuses))}) ORDER BY id DESC",
+            list(refs) + list(statuses), Job.row_factory
+        )
+
+    def _claim(self):
+        kinds = list(self._handlers)
+        if not kinds:
+            return None
+        with self.storage.writer() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, progress = 0, "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ("
+                "SELECT id FROM jobs WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP "
+                f"AND kind IN ({', '.join('?' * len(kinds))}) ORDER BY priority, id LIMIT 1) RETURNING *",
+                kinds
+            )
+            row = cursor.fetchone()
+            return Job.row_factory(cursor, row) if row else None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._execute(job)
+
+    def _execute(self, job):
+        running = RunningJob(self, job)
+        with self._lock:
+            self._running[job.id] = running
+        try:
+            self._handlers[job.kind](running)
+        except JobCancelled:
+            self._finish(job.id, 'cancelled')
+        except Exception as e:
+            if running.cancelled:
+                self._finish(job.id, 'cancelled')
+            elif job.attempts < job.max_attempts:
+                delay = RETRY_BACKOFF * 2 ** (job.attempts - 1)
+                self.storage.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, run_after = datetime('now', ?), "
+                    "updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+                    (str(e), f'+{delay} seconds', job.id)
+                )
+            else:
+                self._finish(job.id, 'failed', str(e))
+        else:
+            self._finish(job.id, 'done')
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
+
+    def _finish(self, job_id, status, error=None):
+        self.storage.execute(
+            "UPDATE jobs SET status = ?, error = ?, "
+            "progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND status = 'running'",
+            (status, error, status, job_id)
+        )
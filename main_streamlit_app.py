@@ -1,4 +1,5 @@
 import streamlit as st
+import atexit
 import sqlite3
 import pandas as pd
 import os
@@ -6,6 +7,20 @@ from datetime import datetime
 import hashlib
 import uuid
 
+from database import DEFAULT_DB_PATH, StorageEngine
+from migrations import migrate_storage
+from query_cache import QueryCache
+from records import Stream, StreamGroup, User, Video, format_timestamp
+from jobs import JobQueue
+from renditions import RENDITION_PROFILES, RenditionStore
+from scheduler import StreamScheduler
+from streaming_engine import StreamError, resolve_output_url
+from streaming_service import StreamingService, group_key
+from video_storage import BlobStore, hash_source
+
+# Rows per page in the gallery and stream list
+PAGE_SIZE = int(os.environ.get('STREAMFLOW_PAGE_SIZE', '10'))
+
 # Set page config
 st.set_page_config(
     page_title="StreamFlow - Live Streaming Platform",
@@ -14,66 +29,55 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Database setup for cloud deployment
-def init_database():
-    """Initialize SQLite database with required tables"""
-    # Use in-memory database for cloud deployment
-    if 'db_connection' not in st.session_state:
-        st.session_state.db_connection = sqlite3.connect(':memory:', check_same_thread=False)
-    
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            avatar_path TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create videos table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            filename TEXT NOT NULL,
-            original_name TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            thumbnail_path TEXT,
-            duration INTEGER,
-            file_size INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Create streams table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS streams (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            platform TEXT NOT NULL,
-            stream_key TEXT NOT NULL,
-            video_id INTEGER,
-            status TEXT DEFAULT 'pending',
-            scheduled_time TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (video_id) REFERENCES videos (id)
-        )
-    ''')
-    
-    conn.commit()
-    return conn
+# Database setup
+@st.cache_resource
+def get_storage():
+    """Shared on-disk database for every session in this process"""
+    storage = StorageEngine(DEFAULT_DB_PATH)
+    # Schema changes run once here, not on every Streamlit rerun
+    migrate_storage(storage)
+    return storage
+
+@st.cache_resource
+def get_query_cache():
+    """Process-wide cache of per-user read query results"""
+    return QueryCache()
+
+@st.cache_resource
+def get_blob_store():
+    """Deduplicating video file storage shared by all sessions"""
+    return BlobStore(get_storage())
+
+@st.cache_resource
+def get_job_queue():
+    """Worker pool for heavy media work, kept off the script thread"""
+    return JobQueue(get_storage()).start()
+
+@st.cache_resource
+def get_rendition_store():
+    """Platform-ready copies of uploaded videos, encoded as background jobs"""
+    return RenditionStore(get_storage(), get_job_queue())
+
+@st.cache_resource
+def get_streaming_service():
+    """ffmpeg processes are owned by the server process, not by a session"""
+    service = StreamingService(get_storage(), get_query_cache(), renditions=get_rendition_store())
+    # Take back or clean up encoders a crashed server left behind
+    service.reconcile()
+    # A redeploy or Ctrl+C must not leave encoders running without an owner
+    atexit.register(service.shutdown)
+    return service
+
+@st.cache_resource
+def get_scheduler():
+    """One thread per process starting streams at their scheduled_time"""
+    return StreamScheduler(get_storage(), get_streaming_service()).start()
 
 # Initialize database
-init_database()
+get_storage()
+# Start the job workers so work queued by an earlier run resumes
+get_rendition_store()
+get_scheduler()
 
 # Authentication functions
 def hash_password(password):
@@ -83,32 +87,25 @@ def verify_password(password, hash_password):
     return hash_password == hashlib.sha256(password.encode()).hexdigest()
 
 def create_user(username, email, password):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
     password_hash = hash_password(password)
     
     try:
-        cursor.execute(
+        get_storage().execute(
             "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
             (username, email, password_hash)
         )
-        conn.commit()
         return True
     except sqlite3.IntegrityError:
         return False
 
 def authenticate_user(username, password):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    
-    cursor.execute(
+    user = get_storage().fetchone(
         "SELECT id, username, email, password_hash FROM users WHERE username = ?",
-        (username,)
+        (username,), row_factory=User.row_factory
     )
-    user = cursor.fetchone()
     
-    if user and verify_password(password, user[3]):
-        return {'id': user[0], 'username': user[1], 'email': user[2]}
+    if user and verify_password(password, user.password_hash):
+        return {'id': user.id, 'username': user.username, 'email': user.email}
     return None
 
 # Session management
@@ -225,14 +222,16 @@ def dashboard_page():
     # Main content
     col1, col2, col3 = st.columns(3)
     
+    summary = get_dashboard_summary()
+    
     with col1:
-        st.metric("Total Video", get_user_video_count(), help="Jumlah video yang telah diupload")
+        st.metric("Total Video", summary['video_count'], help="Jumlah video yang telah diupload")
     
     with col2:
-        st.metric("Stream Aktif", get_user_stream_count(), help="Jumlah stream yang sedang berjalan")
+        st.metric("Stream Aktif", summary['active_stream_count'], help="Jumlah stream yang sedang berjalan")
     
     with col3:
-        st.metric("Total Stream", get_user_total_streams(), help="Total stream yang pernah dibuat")
+        st.metric("Total Stream", summary['stream_count'], help="Total stream yang pernah dibuat")
     
     st.markdown("---")
     
@@ -260,7 +259,8 @@ def dashboard_page():
     st.subheader("📋 Aktivitas Terbaru")
     recent_streams = get_recent_streams()
     if recent_streams:
-        df = pd.DataFrame(recent_streams, columns=['Judul', 'Platform', 'Status', 'Dibuat'])
+        data = [[stream.title, stream.platform, stream.status, stream.created_at] for stream in recent_streams]
+        df = pd.DataFrame(data, columns=['Judul', 'Platform', 'Status', 'Dibuat'])
         st.dataframe(df, use_container_width=True)
     else:
         st.info("Belum ada aktivitas terbaru")
@@ -275,34 +275,57 @@ def gallery_page():
     
     if uploaded_file is not None:
         st.success(f"Video '{uploaded_file.name}' siap diupload!")
-        st.warning("⚠️ Catatan: Pada versi demo ini, file tidak benar-benar tersimpan di server.")
         
-        # Simulate saving to database
         if st.button("Simpan Video", use_container_width=True):
-            save_video_to_db(uploaded_file.name, f"uploads/{uploaded_file.name}")
-            st.success("Video berhasil disimpan ke database!")
-            st.rerun()
+            # Hash first: identical content is never written twice
+            checksum, file_size = hash_source(uploaded_file)
+            duplicate = find_video_by_checksum(checksum)
+            if duplicate:
+                st.warning(f"Video ini sudah ada di galeri sebagai '{duplicate.original_name}'.")
+            else:
+                save_video_to_db(uploaded_file, uploaded_file.name, checksum, file_size)
+                st.success("Video berhasil disimpan!")
+                st.rerun()
     
     st.markdown("---")
     
     # Display videos
     st.subheader("📚 Video Anda")
-    videos = get_user_videos()
+    videos, next_cursor = get_user_videos_page(get_page_cursor('gallery'))
     
     if videos:
+        checksums = [video.checksum for video in videos]
+        renditions = get_rendition_store().statuses(checksums)
+        jobs = {}
+        for job in get_job_queue().jobs_for_refs(checksums):
+            jobs.setdefault(job.ref, []).append(job)
         for video in videos:
-            with st.expander(f"🎥 {video[2]}"):
+            with st.expander(f"🎥 {video.original_name}"):
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    st.write(f"**Nama File:** {video[1]}")
-                    st.write(f"**Ukuran:** {video[5] if video[5] else 'Unknown'} bytes")
+                    st.write(f"**Nama File:** {video.filename}")
+                    st.write(f"**Ukuran:** {video.file_size if video.file_size else 'Unknown'} bytes")
+                    if video.video_codec:
+                        st.write(f"**Format:** {video.video_codec}/{video.audio_codec or '-'} {video.resolution or ''} {video.fps or ''} fps, {video.bitrate or '?'} kbps")
+                    for profile, status in renditions.get(video.checksum, {}).items():
+                        st.write(f"**{RENDITION_PROFILES[profile]['resolution']}:** {status}")
+                    for job in jobs.get(video.checksum, []):
+                        if job.status == 'failed':
+                            st.caption(f"⚠️ Proses {job.kind} gagal: {job.error}")
+                            continue
+                        st.progress(job.progress, text=f"⏳ {job.kind} ({job.status}, percobaan {job.attempts}/{job.max_attempts})")
+                        if st.button("Batalkan", key=f"cancel_job_{job.id}"):
+                            get_job_queue().cancel(job.id)
+                            st.rerun()
                 
                 with col2:
-                    st.write(f"**Upload:** {video[6]}")
-                    if st.button(f"Hapus", key=f"delete_{video[0]}"):
-                        delete_video(video[0])
+                    st.write(f"**Upload:** {video.created_at}")
+                    if st.button(f"Hapus", key=f"delete_{video.id}"):
+                        delete_video(video.id)
                         st.rerun()
+        
+        page_navigator('gallery', next_cursor)
     else:
         st.info("Belum ada video yang diupload")
 
@@ -322,17 +345,22 @@ def streams_page():
         
         with col2:
             stream_key = st.text_input("Stream Key", type="password", placeholder="Masukkan RTMP stream key")
-            video_id = st.selectbox("Pilih Video", get_video_options())
+            video_option = st.selectbox("Pilih Video", get_video_options(), format_func=lambda option: option[0])
         
         scheduled_time = st.datetime_input("Jadwal Stream (Opsional)", value=None)
+        loop_video = st.checkbox("🔁 Ulangi video terus-menerus", value=True)
         
         submit_button = st.form_submit_button("🚀 Buat Stream", use_container_width=True)
         
         if submit_button:
             if title and platform and stream_key:
-                create_stream(title, platform, stream_key, video_id, scheduled_time)
-                st.success("Stream berhasil dibuat!")
-                st.rerun()
+                try:
+                    create_stream(title, platform, stream_key, video_option[1], scheduled_time, loop_video)
+                except StreamError as e:
+                    st.error(f"Stream Key tidak valid: {e}")
+                else:
+                    st.success("Stream berhasil dibuat!")
+                    st.rerun()
             else:
                 st.error("Silakan isi semua field yang diperlukan")
     
@@ -346,51 +374,192 @@ def streams_page():
     - **Facebook:** Facebook Live → Use Stream Key → Copy Key
     - **Twitch:** Creator Dashboard → Settings → Stream Key
     - **TikTok:** TikTok Live Studio → Get Stream Key
+    
+    Untuk TikTok, Instagram dan Custom RTMP, isi Stream Key dengan URL RTMP lengkap
+    (contoh: `rtmp://server/app/stream-key`).
     """)
     
     st.markdown("---")
     
     # Display streams
     st.subheader("📋 Stream Anda")
-    streams = get_user_streams()
+    streams, next_cursor = get_user_streams_page(get_page_cursor('streams'))
     
     if streams:
         for stream in streams:
-            with st.expander(f"📺 {stream[2]} - {stream[3]} ({stream[5]})"):
+            with st.expander(f"📺 {stream.title} - {stream.platform} ({stream.status})"):
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    st.write(f"**Judul:** {stream[2]}")
-                    st.write(f"**Platform:** {stream[3]}")
-                    st.write(f"**Status:** {stream[5]}")
+                    st.write(f"**Judul:** {stream.title}")
+                    st.write(f"**Platform:** {stream.platform}")
+                    st.write(f"**Status:** {stream.status}")
                 
                 with col2:
-                    if stream[6]:  # scheduled_time
-                        st.write(f"**Jadwal:** {stream[6]}")
-                    st.write(f"**Dibuat:** {stream[7]}")
+                    if stream.scheduled_time:
+                        st.write(f"**Jadwal:** {stream.scheduled_time}")
+                    if stream.start_latency_ms is not None:
+                        st.write(f"**Latensi Mulai:** {stream.start_latency_ms} ms")
+                    st.write(f"**Dibuat:** {stream.created_at}")
+                
+                if stream.status in ('active', 'reconnecting'):
+                    stream_metrics_panel(stream.id, stream.group_id)
+                elif stream.status == 'queued':
+                    st.info("⏳ Menunggu kapasitas server; stream akan dimulai otomatis (alasan ada di log)")
+                
+                if st.toggle("📜 Tampilkan log", key=f"logs_{stream.id}"):
+                    stream_log_viewer(stream.id, stream.group_id)
                 
                 # Action buttons
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
-                    if st.button(f"▶️ Mulai", key=f"start_{stream[0]}"):
-                        update_stream_status(stream[0], 'active')
-                        st.success("Stream dimulai!")
-                        st.rerun()
+                    if st.button(f"▶️ Mulai", key=f"start_{stream.id}"):
+                        try:
+                            update_stream_status(stream.id, 'active')
+                            st.success("Stream dimulai!")
+                            st.rerun()
+                        except StreamError as e:
+                            st.error(f"Gagal memulai stream: {e}")
                 
                 with col2:
-                    if st.button(f"⏹️ Berhenti", key=f"stop_{stream[0]}"):
-                        update_stream_status(stream[0], 'stopped')
-                        st.success("Stream dihentikan!")
-                        st.rerun()
+                    if st.button(f"⏹️ Berhenti", key=f"stop_{stream.id}"):
+                        try:
+                            update_stream_status(stream.id, 'stopped')
+                            st.success("Stream dihentikan!")
+                            st.rerun()
+                        except StreamError as e:
+                            st.error(f"Gagal menghentikan stream: {e}")
                 
                 with col3:
-                    if st.button(f"🗑️ Hapus", key=f"delete_stream_{stream[0]}"):
-                        delete_stream(stream[0])
+                    if st.button(f"🗑️ Hapus", key=f"delete_stream_{stream.id}"):
+                        delete_stream(stream.id)
                         st.success("Stream dihapus!")
                         st.rerun()
+        
+        page_navigator('streams', next_cursor)
     else:
         st.info("Belum ada stream yang dibuat")
+    
+    st.markdown("---")
+    
+    # Stream groups: one encode pushed to several platforms at once
+    st.subheader("🔀 Grup Multi-Platform")
+    
+    with st.form("stream_group_form"):
+        group_title = st.text_input("Nama Grup", placeholder="Contoh: Siaran YouTube + Twitch")
+        member_options = get_ungrouped_stream_options()
+        members = st.multiselect("Stream Anggota (video harus sama)", member_options, format_func=lambda option: option[0])
+        
+        if st.form_submit_button("➕ Buat Grup", use_container_width=True):
+            if group_title and len(members) >= 2:
+                create_stream_group(group_title, [member[1] for member in members])
+                st.success("Grup stream berhasil dibuat!")
+                st.rerun()
+            else:
+                st.error("Isi nama grup dan pilih minimal dua stream")
+    
+    groups = get_user_stream_groups()
+    
+    for group, group_members in groups:
+        statuses = ', '.join(f"{member.platform}: {member.status}" for member in group_members)
+        with st.expander(f"🔀 {group.title} ({statuses or 'kosong'})"):
+            for member in group_members:
+                st.write(f"- **{member.title}** ({member.platform})")
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                if st.button("▶️ Mulai Grup", key=f"start_group_{group.id}"):
+                    try:
+                        get_streaming_service().start_group(group.id, st.session_state.user['id'])
+                        invalidate_user_cache()
+                        st.success("Grup stream dimulai!")
+                        st.rerun()
+                    except StreamError as e:
+                        st.error(f"Gagal memulai grup: {e}")
+            
+            with col2:
+                if st.button("⏹️ Hentikan Grup", key=f"stop_group_{group.id}"):
+                    try:
+                        get_streaming_service().stop_group(group.id, st.session_state.user['id'])
+                        invalidate_user_cache()
+                        st.success("Grup stream dihentikan!")
+                        st.rerun()
+                    except StreamError as e:
+                        st.error(f"Gagal menghentikan grup: {e}")
+            
+            with col3:
+                if st.button("🗑️ Hapus Grup", key=f"delete_group_{group.id}"):
+                    delete_stream_group(group.id)
+                    st.success("Grup dihapus, stream anggotanya tetap ada")
+                    st.rerun()
+
+# Live ffmpeg telemetry, refreshed without rerunning the whole page
+@st.fragment(run_every=2)
+def stream_metrics_panel(stream_id, group_id=None):
+    metrics = get_streaming_service().stream_metrics(stream_id, group_id)
+    if not metrics or not metrics['time']:
+        st.caption("Menunggu data progres dari ffmpeg...")
+        return
+    
+    data = pd.DataFrame(metrics)
+    data['time'] = pd.to_datetime(data['time'], unit='s')
+    data = data.set_index('time')
+    latest = data.iloc[-1]
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("FPS", f"{latest['fps']:.1f}")
+    
+    with col2:
+        st.metric("Bitrate", f"{latest['bitrate_kbps']:.0f} kbps")
+    
+    with col3:
+        st.metric("Kecepatan", f"{latest['speed']:.2f}x")
+    
+    with col4:
+        st.metric("Frame Drop/Dup", f"{latest['drop_frames']:.0f} / {latest['dup_frames']:.0f}")
+    
+    # With -re the encoder should keep pace with real time (1.0x)
+    if latest['speed'] < 0.95:
+        st.warning("Encoder tertinggal dari waktu nyata; pertimbangkan bitrate atau resolusi lebih rendah")
+    
+    st.line_chart(data[['fps', 'speed']])
+    st.line_chart(data[['bitrate_kbps']])
+
+@st.fragment(run_every=3)
+def stream_log_viewer(stream_id, group_id=None):
+    lines = get_streaming_service().stream_logs(stream_id, group_id)
+    if lines:
+        st.code("\n".join(f"{created_at}  {message}" for created_at, message in lines), language=None)
+    else:
+        st.caption("Belum ada log untuk stream ini")
+
+# Pagination
+def get_page_cursor(name):
+    """Cursor of the page currently shown for a paginated list"""
+    if f'{name}_cursors' not in st.session_state:
+        st.session_state[f'{name}_cursors'] = [None]
+    return st.session_state[f'{name}_cursors'][-1]
+
+def page_navigator(name, next_cursor):
+    cursors = st.session_state[f'{name}_cursors']
+    col1, col2, col3 = st.columns([1, 2, 1])
+    
+    with col1:
+        if len(cursors) > 1 and st.button("◀️ Sebelumnya", key=f"{name}_prev", use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    
+    with col2:
+        st.caption(f"Halaman {len(cursors)}")
+    
+    with col3:
+        if next_cursor is not None and st.button("Berikutnya ▶️", key=f"{name}_next", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
 
 # Settings
 def settings_page():
@@ -436,6 +605,75 @@ def settings_page():
     
     st.markdown("---")
     
+    st.subheader("📊 Cache Query")
+    cache_stats = get_query_cache().stats()
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Cache Hit", cache_stats['hits'])
+    
+    with col2:
+        st.metric("Cache Miss", cache_stats['misses'])
+    
+    with col3:
+        st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+    
+    st.markdown("---")
+    
+    st.subheader("💾 Penyimpanan Video")
+    blob_stats = get_blob_store().stats()
+    saved = blob_stats['logical_bytes'] - blob_stats['stored_bytes']
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Ukuran Semua Video", f"{blob_stats['logical_bytes'] / 1024 ** 2:.1f} MB")
+    
+    with col2:
+        st.metric("Tersimpan di Disk", f"{blob_stats['stored_bytes'] / 1024 ** 2:.1f} MB")
+    
+    with col3:
+        st.metric("Hemat (Deduplikasi)", f"{saved / 1024 ** 2:.1f} MB")
+    
+    st.markdown("---")
+    
+    st.subheader("🖥️ Kapasitas Server")
+    capacity = get_streaming_service().capacity.stats()
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Output Berjalan", capacity['outputs'])
+    
+    with col2:
+        st.metric("CPU Terpakai (perkiraan)", f"{capacity['used']:.1f} core")
+    
+    with col3:
+        st.metric("Batas CPU Stream", f"{capacity['budget']:.1f} core")
+    
+    if capacity['costs']:
+        st.caption("Biaya CPU terukur: " + ", ".join(
+            f"{name} ±{cores:.2f} core" for name, cores in sorted(capacity['costs'].items())
+        ))
+    
+    st.markdown("---")
+    
+    st.subheader("⏱️ Latensi Stream Terjadwal")
+    latencies = get_start_latencies()
+    if latencies:
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.metric("Stream Terjadwal", len(latencies))
+        
+        with col2:
+            st.metric("Median", f"{latencies[len(latencies) // 2]} ms")
+        
+        with col3:
+            st.metric("P95", f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]} ms")
+    else:
+        st.info("Belum ada stream terjadwal yang dimulai")
+    
+    st.markdown("---")
+    
     st.subheader("📝 Tentang Aplikasi")
     st.markdown("""
     **StreamFlow v2.0** - Platform Live Streaming Multi-Platform
@@ -450,126 +688,232 @@ def settings_page():
     """)
 
 # Database helper functions
-def get_user_video_count():
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM videos WHERE user_id = ?", (st.session_state.user['id'],))
-    count = cursor.fetchone()[0]
-    return count
-
-def get_user_stream_count():
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM streams WHERE user_id = ? AND status = 'active'", (st.session_state.user['id'],))
-    count = cursor.fetchone()[0]
-    return count
-
-def get_user_total_streams():
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM streams WHERE user_id = ?", (st.session_state.user['id'],))
-    count = cursor.fetchone()[0]
-    return count
+def cached_fetchone(sql, params, row_factory=None):
+    """Read helper result for the current user, served from the query cache"""
+    return get_query_cache().get_or_load(
+        ('fetchone', sql, params), st.session_state.user['id'],
+        lambda: get_storage().fetchone(sql, params, row_factory)
+    )
 
-def get_recent_streams():
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT title, platform, status, created_at FROM streams WHERE user_id = ? ORDER BY created_at DESC LIMIT 5",
+def cached_fetchall(sql, params, row_factory=None):
+    return get_query_cache().get_or_load(
+        ('fetchall', sql, params), st.session_state.user['id'],
+        lambda: get_storage().fetchall(sql, params, row_factory)
+    )
+
+def invalidate_user_cache():
+    """Called by every write helper so the next rerun sees the change"""
+    get_query_cache().invalidate_user(st.session_state.user['id'])
+
+def get_dashboard_summary():
+    """All dashboard counters in one primary-key lookup on user_stats"""
+    row = cached_fetchone(
+        "SELECT video_count, stream_count, active_stream_count FROM user_stats WHERE user_id = ?",
+        (st.session_state.user['id'],)
+    )
+    if row is None:
+        return {'video_count': 0, 'stream_count': 0, 'active_stream_count': 0}
+    return {'video_count': row[0], 'stream_count': row[1], 'active_stream_count': row[2]}
+
+def get_start_latencies():
+    """Sorted start latencies of the current user's scheduled streams"""
+    rows = cached_fetchall(
+        "SELECT start_latency_ms FROM streams WHERE user_id = ? AND start_latency_ms IS NOT NULL ORDER BY start_latency_ms",
         (st.session_state.user['id'],)
     )
-    streams = cursor.fetchall()
-    return streams
+    return [row[0] for row in rows]
 
-def save_video_to_db(filename, file_path):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
+def get_recent_streams():
+    return cached_fetchall(
+        "SELECT title, platform, status, created_at FROM streams WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT 5",
+        (st.session_state.user['id'],), Stream.row_factory
+    )
+
+def save_video_to_db(source, original_name, checksum, file_size):
+    user_id = st.session_state.user['id']
+    
+    video_ids = []
     
-    file_size = 1024 * 1024  # Demo size
+    def insert_video(conn, file_path):
+        cursor = conn.execute(
+            "INSERT INTO videos (user_id, filename, original_name, file_path, file_size, checksum) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, os.path.basename(file_path), original_name, file_path, file_size, checksum)
+        )
+        video_ids.append(cursor.lastrowid)
+    
+    get_blob_store().store(source, original_name, checksum, file_size, insert_video)
+    invalidate_user_cache()
     
-    cursor.execute(
-        "INSERT INTO videos (user_id, filename, original_name, file_path, file_size) VALUES (?, ?, ?, ?, ?)",
-        (st.session_state.user['id'], filename, filename, file_path, file_size)
+    # Probe at upload so starting a stream does not wait on ffprobe
+    video = get_storage().fetchone("SELECT * FROM videos WHERE id = ?", (video_ids[0],), Video.row_factory)
+    get_streaming_service().probe(video)
+    get_rendition_store().enqueue(checksum, video.file_path)
+
+def find_video_by_checksum(checksum):
+    return get_storage().fetchone(
+        "SELECT id, original_name FROM videos WHERE user_id = ? AND checksum = ? LIMIT 1",
+        (st.session_state.user['id'], checksum), Video.row_factory
     )
-    conn.commit()
 
-def get_user_videos():
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM videos WHERE user_id = ? ORDER BY created_at DESC",
-        (st.session_state.user['id'],)
+def fetch_page(sql, user_id, cursor, limit, row_factory):
+    """Keyset pagination over (created_at, id), newest first.
+
+    Returns the rows of one page and the cursor for the next page, or None
+    when this is the last page.
+    """
+    if cursor is None:
+        rows = cached_fetchall(sql.format(where=""), (user_id, limit + 1), row_factory)
+    else:
+        rows = cached_fetchall(
+            sql.format(where="AND (created_at, id) < (?, ?)"),
+            (user_id, cursor[0], cursor[1], limit + 1), row_factory
+        )
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], (format_timestamp(last.created_at), last.id)
+
+def get_user_videos_page(cursor=None, limit=PAGE_SIZE):
+    return fetch_page(
+        "SELECT id, filename, original_name, file_size, created_at, checksum, "
+        "video_codec, audio_codec, resolution, fps, bitrate FROM videos "
+        "WHERE user_id = ? {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+        st.session_state.user['id'], cursor, limit, Video.row_factory
     )
-    videos = cursor.fetchall()
-    return videos
 
 def delete_video(video_id):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM videos WHERE id = ?", (video_id,))
-    conn.commit()
+    user_id = st.session_state.user['id']
+    video = get_storage().fetchone(
+        "SELECT file_path, checksum FROM videos WHERE id = ? AND user_id = ?",
+        (video_id, user_id), Video.row_factory
+    )
+    if video:
+        # The file itself is only unlinked when no other video references it
+        get_blob_store().release(
+            video.checksum, video.file_path,
+            lambda conn: conn.execute(
+                "DELETE FROM videos WHERE id = ? AND user_id = ?", (video_id, user_id)
+            ).rowcount > 0
+        )
+    invalidate_user_cache()
 
 def get_video_options():
-    videos = get_user_videos()
+    videos = cached_fetchall(
+        "SELECT id, original_name FROM videos WHERE user_id = ? ORDER BY created_at DESC, id DESC",
+        (st.session_state.user['id'],), Video.row_factory
+    )
     options = [("Tidak ada video", None)]
     for video in videos:
-        options.append((video[3], video[0]))  # (original_name, id)
+        options.append((video.original_name, video.id))
     return options
 
-def create_stream(title, platform, stream_key, video_id, scheduled_time):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "INSERT INTO streams (user_id, title, platform, stream_key, video_id, scheduled_time) VALUES (?, ?, ?, ?, ?, ?)",
-        (st.session_state.user['id'], title, platform, stream_key, video_id, scheduled_time)
+def create_stream(title, platform, stream_key, video_id, scheduled_time, loop_video=True):
+    # A key that cannot become an output URL is refused now, not at start time
+    resolve_output_url(platform, stream_key)
+    stream_id = get_storage().execute(
+        "INSERT INTO streams (user_id, title, platform, stream_key, video_id, scheduled_time, loop_video) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (st.session_state.user['id'], title, platform, stream_key, video_id, scheduled_time, int(loop_video))
+    ).lastrowid
+    invalidate_user_cache()
+    
+    if scheduled_time is not None:
+        get_scheduler().schedule(stream_id, scheduled_time)
+    
+    # Renditions for a scheduled stream are due by its start time
+    if scheduled_time is not None and video_id is not None:
+        video = get_storage().fetchone("SELECT checksum FROM videos WHERE id = ?", (video_id,))
+        if video is not None and video[0]:
+            get_job_queue().prioritize(video[0], int(scheduled_time.timestamp()))
+
+def get_user_streams_page(cursor=None, limit=PAGE_SIZE):
+    return fetch_page(
+        "SELECT id, title, platform, status, scheduled_time, created_at, start_latency_ms, group_id FROM streams "
+        "WHERE user_id = ? {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+        st.session_state.user['id'], cursor, limit, Stream.row_factory
     )
-    conn.commit()
 
-def get_user_streams():
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM streams WHERE user_id = ? ORDER BY created_at DESC",
-        (st.session_state.user['id'],)
+def get_ungrouped_stream_options():
+    streams = cached_fetchall(
+        "SELECT id, title, platform FROM streams WHERE user_id = ? AND group_id IS NULL ORDER BY created_at DESC, id DESC",
+        (st.session_state.user['id'],), Stream.row_factory
     )
-    streams = cursor.fetchall()
-    return streams
+    return [(f"{stream.title} - {stream.platform}", stream.id) for stream in streams]
 
-def update_stream_status(stream_id, status):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE streams SET status = ? WHERE id = ?",
-        (status, stream_id)
+def create_stream_group(title, stream_ids):
+    user_id = st.session_state.user['id']
+    with get_storage().writer() as conn:
+        group_id = conn.execute(
+            "INSERT INTO stream_groups (user_id, title) VALUES (?, ?)", (user_id, title)
+        ).lastrowid
+        conn.executemany(
+            "UPDATE streams SET group_id = ? WHERE id = ? AND user_id = ?",
+            [(group_id, stream_id, user_id) for stream_id in stream_ids]
+        )
+    invalidate_user_cache()
+
+def get_user_stream_groups():
+    """(group, member streams) pairs for the current user, loaded in two queries"""
+    user_id = st.session_state.user['id']
+    groups = cached_fetchall(
+        "SELECT * FROM stream_groups WHERE user_id = ? ORDER BY created_at DESC, id DESC",
+        (user_id,), StreamGroup.row_factory
     )
-    conn.commit()
+    members = {}
+    for stream in cached_fetchall(
+        "SELECT id, title, platform, status, group_id FROM streams WHERE user_id = ? AND group_id IS NOT NULL ORDER BY id",
+        (user_id,), Stream.row_factory
+    ):
+        members.setdefault(stream.group_id, []).append(stream)
+    return [(group, members.get(group.id, [])) for group in groups]
+
+def delete_stream_group(group_id):
+    service = get_streaming_service()
+    group = service.get_group(group_id, st.session_state.user['id'])
+    # Members that were not live keep their status
+    service.stop_process(group_key(group.id))
+    with get_storage().writer() as conn:
+        conn.execute("UPDATE streams SET group_id = NULL WHERE group_id = ?", (group.id,))
+        conn.execute("DELETE FROM stream_groups WHERE id = ?", (group.id,))
+        conn.execute("DELETE FROM stream_logs WHERE group_id = ?", (group.id,))
+    invalidate_user_cache()
+
+def update_stream_status(stream_id, status):
+    """Start or stop the stream's ffmpeg process; raises StreamError on failure"""
+    service = get_streaming_service()
+    user_id = st.session_state.user['id']
+    if status == 'active':
+        service.start_stream(stream_id, user_id)
+    elif status == 'stopped':
+        service.stop_stream(stream_id, user_id)
+    else:
+        service.set_status(service.get_stream(stream_id, user_id).id, status)
+    invalidate_user_cache()
 
 def delete_stream(stream_id):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM streams WHERE id = ?", (stream_id,))
-    conn.commit()
+    get_scheduler().cancel(stream_id)
+    get_streaming_service().stop_process(stream_id)
+    with get_storage().writer() as conn:
+        deleted = conn.execute(
+            "DELETE FROM streams WHERE id = ? AND user_id = ?",
+            (stream_id, st.session_state.user['id'])
+        ).rowcount
+        if deleted:
+            conn.execute("DELETE FROM stream_logs WHERE stream_id = ?", (stream_id,))
+    invalidate_user_cache()
 
 def verify_current_password(user_id, password):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    cursor.execute("SELECT password_hash FROM users WHERE id = ?", (user_id,))
-    result = cursor.fetchone()
+    result = get_storage().fetchone("SELECT password_hash FROM users WHERE id = ?", (user_id,))
     
     if result:
         return verify_password(password, result[0])
     return False
 
 def update_password(user_id, new_password):
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
     password_hash = hash_password(new_password)
-    cursor.execute(
+    get_storage().execute(
         "UPDATE users SET password_hash = ? WHERE id = ?",
         (password_hash, user_id)
     )
-    conn.commit()
 
 # Main app
 def main():
@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import subprocess
+from fractions import Fraction
+
+FFPROBE_PATH = os.environ.get('FFPROBE_PATH') or shutil.which('ffprobe') or 'ffprobe'
+# Seconds of packets scanned to measure the keyframe interval
+KEYFRAME_SCAN_SECONDS = 60
+
+# What each platform accepts without re-encoding. Sizes are (long side,
+# short side) so landscape and portrait sources are judged the same way.
+PLATFORM_PROFILES = {
+    'YouTube': {
+        'video_codecs': ('h264',), 'audio_codecs': ('aac', 'mp3'),
+        'max_size': (3840, 2160), 'max_fps': 60, 'max_bitrate': 51000,
+        'max_keyframe_interval': 4.0, 'default_resolution': '1280x720',
+    },
+    'Facebook': {
+        'video_codecs': ('h264',), 'audio_codecs': ('aac',),
+        'max_size': (1920, 1080), 'max_fps': 60, 'max_bitrate': 9000,
+        'max_keyframe_interval': 2.0, 'default_resolution': '1280x720',
+    },
+    'Twitch': {
+        'video_codecs': ('h264',), 'audio_codecs': ('aac',),
+        'max_size': (1920, 1080), 'max_fps': 60, 'max_bitrate': 6000,
+        'max_keyframe_interval': 2.0, 'default_resolution': '1280x720',
+    },
+    'TikTok': {
+        'video_codecs': ('h264',), 'audio_codecs': ('aac',),
+        'max_size': (1920, 1080), 'max_fps': 30, 'max_bitrate': 6000,
+        'max_keyframe_interval': 2.0, 'default_resolution': '720x1280',
+    },
+    'Instagram': {
+        'video_codecs': ('h264',), 'audio_codecs': ('aac',),
+        'max_size': (1920, 1080), 'max_fps': 30, 'max_bitrate': 4000,
+        'max_keyframe_interval': 2.0, 'default_resolution': '720x1280',
+    },
+    # FLV over RTMP only carries these codecs; nothing else is known
+    'Custom RTMP': {
+        'video_codecs': ('h264',), 'audio_codecs': ('aac', 'mp3'),
+        'max_size': None, 'max_fps': None, 'max_bitrate': None,
+        'max_keyframe_interval': None, 'default_resolution': '1280x720',
+    },
+}
+
+
+class ProbeError(Exception):
+    """ffprobe is missing or could not read the file"""
+
+
+def _run(args, timeout=60):
+    try:
+        result = subprocess.run(args, capture_output=True, timeout=timeout, check=False)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ProbeError(str(e)) from e
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.decode('utf-8', 'replace').strip() or f"ffprobe exited with {result.returncode}")
+    return result.stdout.decode('utf-8', 'replace')
+
+
+def _frame_rate(value):
+    try:
+        rate = Fraction(value)
+    except (ValueError, ZeroDivisionError, TypeError):
+        return None
+    return round(float(rate), 3) if rate > 0 else None
+
+
+def probe_video(path, ffprobe_path=FFPROBE_PATH):
+    """Codec, size, frame rate, bitrate, duration and keyframe interval of a file.
+
+    Returns a dict with the keys stored on the videos row: video_codec,
+    audio_codec, resolution ('WxH'), fps, bitrate (kbps), duration (s) and
+    keyframe_interval (largest gap between keyframes, in seconds).
+    """
+    info = json.loads(_run([
+        ffprobe_path, '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams', path,
+    ]))
+    streams = info.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    if video is None:
+        raise ProbeError("File tidak memiliki stream video")
+
+    fmt = info.get('format', {})
+    bit_rate = fmt.get('bit_rate') or video.get('bit_rate')
+    duration = fmt.get('duration') or video.get('duration')
+    return {
+        'video_codec': video.get('codec_name'),
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'resolution': f"{video['width']}x{video['height']}" if video.get('width') else None,
+        'fps': _frame_rate(video.get('avg_frame_rate')) or _frame_rate(video.get('r_frame_rate')),
+        'bitrate': int(bit_rate) // 1000 if bit_rate else None,
+        'duration': int(float(duration)) if duration else None,
+        'keyframe_interval': probe_keyframe_interval(path, ffprobe_path),
+    }
+
+
+def probe_keyframe_interval(path, ffprobe_path=FFPROBE_PATH, seconds=KEYFRAME_SCAN_SECONDS):
+    """Largest keyframe gap in the first seconds of the video stream"""
+    output = _run([
+        ffprobe_path, '-v', 'error', '-select_streams', 'v:0',
+        '-read_intervals', f'%+{seconds}',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path,
+    ])
+    times = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if flags.startswith('K') and pts_time not in ('', 'N/A'):
+            times.append(float(pts_time))
+    times.sort()
+    if len(times) < 2:
+        return None
+    return round(max(b - a for a, b in zip(times, times[1:])), 3)
+
+
+def parse_resolution(resolution):
+    width, _, height = (resolution or '').partition('x')
+    if not (width.isdigit() and height.isdigit()):
+        return None
+    return int(width), int(height)
+
+
+def choose_mode(media, platform):
+    """Pick 'copy' or 'transcode' for a probed video on a platform.
+
+    Returns (mode, reasons); reasons lists every limit the source breaks,
+    empty when it can be pushed as is.
+    """
+    profile = PLATFORM_PROFILES.get(platform, PLATFORM_PROFILES['Custom RTMP'])
+    reasons = []
+    if media.get('video_codec') not in profile['video_codecs']:
+        reasons.append(f"codec video {media.get('video_codec')}")
+    if media.get('audio_codec') and media['audio_codec'] not in profile['audio_codecs']:
+        reasons.append(f"codec audio {media['audio_codec']}")
+    size = parse_resolution(media.get('resolution'))
+    if profile['max_size'] and size and (max(size) > profile['max_size'][0] or min(size) > profile['max_size'][1]):
+        reasons.append(f"resolusi {media['resolution']}")
+    if profile['max_fps'] and media.get('fps') and float(media['fps']) > profile['max_fps'] + 0.01:
+        reasons.append(f"{media['fps']} fps")
+    if profile['max_bitrate'] and media.get('bitrate') and media['bitrate'] > profile['max_bitrate']:
+        reasons.append(f"bitrate {media['bitrate']} kbps")
+    interval = media.get('keyframe_interval')
+    if profile['max_keyframe_interval'] and (interval is None or interval > profile['max_keyframe_interval'] + 0.05):
+        reasons.append(f"interval keyframe {interval if interval is not None else 'tidak diketahui'} detik")
+    return ('transcode' if reasons else 'copy'), reasons
+
+
+def transcode_settings(platform, resolution=None, bitrate=None, fps=None):
+    """Stream settings clamped to what the platform accepts, for transcode mode"""
+    profile = PLATFORM_PROFILES.get(platform, PLATFORM_PROFILES['Custom RTMP'])
+    size = parse_resolution(resolution)
+    if size is None or (profile['max_size'] and (max(size) > profile['max_size'][0] or min(size) > profile['max_size'][1])):
+        resolution = profile['default_resolution']
+    bitrate = bitrate or 2500
+    if profile['max_bitrate']:
+        bitrate = min(bitrate, profile['max_bitrate'])
+    fps = fps or 30
+    if profile['max_fps']:
+        fps = min(fps, profile['max_fps'])
+    return {'resolution': resolution, 'bitrate': bitrate, 'fps': fps}
@@ -0,0 +1,303 @@
+import threading
+
+# Ordered schema migrations: (version, description, statements).
+# Append new steps at the end; never edit a step that has already shipped.
+MIGRATIONS = [
+    (1, 'initial schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            avatar_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            original_name TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            thumbnail_path TEXT,
+            duration INTEGER,
+            file_size INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS streams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            stream_key TEXT NOT NULL,
+            video_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            scheduled_time TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (video_id) REFERENCES videos (id)
+        )
+        ''',
+    ]),
+    # Same media columns as the Node schema in db/database.js
+    (2, 'media settings columns', [
+        "ALTER TABLE videos ADD COLUMN resolution TEXT",
+        "ALTER TABLE videos ADD COLUMN bitrate INTEGER",
+        "ALTER TABLE videos ADD COLUMN fps TEXT",
+        "ALTER TABLE streams ADD COLUMN bitrate INTEGER DEFAULT 2500",
+        "ALTER TABLE streams ADD COLUMN resolution TEXT",
+        "ALTER TABLE streams ADD COLUMN fps INTEGER DEFAULT 30",
+    ]),
+    # Every per-user dashboard and listing query filters on user_id
+    (3, 'per-user indexes', [
+        "CREATE INDEX IF NOT EXISTS idx_streams_user_status ON streams (user_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_streams_user_created ON streams (user_id, created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_videos_user_created ON videos (user_id, created_at DESC)",
+    ]),
+    # Per-user dashboard counters, kept in step with videos/streams by triggers
+    # so every writer (UI, scheduler, stream supervisor) updates them in the
+    # same transaction as the row change.
+    (4, 'user dashboard counters', [
+        '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            video_count INTEGER NOT NULL DEFAULT 0,
+            stream_count INTEGER NOT NULL DEFAULT 0,
+            active_stream_count INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        INSERT OR REPLACE INTO user_stats (user_id, video_count, stream_count, active_stream_count)
+        SELECT u.user_id,
+               (SELECT COUNT(*) FROM videos WHERE user_id = u.user_id),
+               (SELECT COUNT(*) FROM streams WHERE user_id = u.user_id),
+               (SELECT COUNT(*) FROM streams WHERE user_id = u.user_id AND status = 'active')
+        FROM (SELECT user_id FROM videos UNION SELECT user_id FROM streams) AS u
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_videos_stats_insert AFTER INSERT ON videos
+        BEGIN
+            INSERT INTO user_stats (user_id, video_count) VALUES (NEW.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET video_count = video_count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_videos_stats_delete AFTER DELETE ON videos
+        BEGIN
+            UPDATE user_stats SET video_count = video_count - 1 WHERE user_id = OLD.user_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_streams_stats_insert AFTER INSERT ON streams
+        BEGIN
+            INSERT INTO user_stats (user_id, stream_count, active_stream_count)
+            VALUES (NEW.user_id, 1, NEW.status = 'active')
+            ON CONFLICT (user_id) DO UPDATE SET
+                stream_count = stream_count + 1,
+                active_stream_count = active_stream_count + (NEW.status = 'active');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_streams_stats_delete AFTER DELETE ON streams
+        BEGIN
+            UPDATE user_stats SET
+                stream_count = stream_count - 1,
+                active_stream_count = active_stream_count - (OLD.status = 'active')
+            WHERE user_id = OLD.user_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_streams_stats_status AFTER UPDATE OF status ON streams
+        WHEN (OLD.status = 'active') != (NEW.status = 'active')
+        BEGIN
+            UPDATE user_stats SET
+                active_stream_count = active_stream_count + (NEW.status = 'active') - (OLD.status = 'active')
+            WHERE user_id = NEW.user_id;
+        END
+        ''',
+    ]),
+    # Keyset pagination orders on (created_at, id); index both so paging
+    # never needs a temp B-tree sort
+    (5, 'keyset pagination indexes', [
+        "DROP INDEX IF EXISTS idx_streams_user_created",
+        "DROP INDEX IF EXISTS idx_videos_user_created",
+        "CREATE INDEX IF NOT EXISTS idx_streams_user_created_id ON streams (user_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_videos_user_created_id ON videos (user_id, created_at DESC, id DESC)",
+    ]),
+    # Content hash of the uploaded file, for duplicate detection
+    (6, 'video checksums', [
+        "ALTER TABLE videos ADD COLUMN checksum TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_videos_user_checksum ON videos (user_id, checksum)",
+    ]),
+    # Content-addressed video files shared by every videos row with the same
+    # checksum; the file is unlinked when ref_count drops to zero
+    (7, 'video blobs', [
+        '''
+        CREATE TABLE IF NOT EXISTS video_blobs (
+            checksum TEXT PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    # Playback and lifecycle columns used by the Python streaming engine,
+    # named as in db/database.js
+    (8, 'stream runtime columns', [
+        "ALTER TABLE streams ADD COLUMN loop_video INTEGER DEFAULT 1",
+        "ALTER TABLE streams ADD COLUMN start_time TIMESTAMP",
+        "ALTER TABLE streams ADD COLUMN end_time TIMESTAMP",
+    ]),
+    # ffprobe results, used to decide between stream copy and transcoding
+    (9, 'video probe columns', [
+        "ALTER TABLE videos ADD COLUMN video_codec TEXT",
+        "ALTER TABLE videos ADD COLUMN audio_codec TEXT",
+        "ALTER TABLE videos ADD COLUMN keyframe_interval REAL",
+    ]),
+    # Streams that go live together from one shared ffmpeg encode
+    (10, 'stream groups', [
+        '''
+        CREATE TABLE IF NOT EXISTS stream_groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            title TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        "ALTER TABLE streams ADD COLUMN group_id INTEGER REFERENCES stream_groups (id)",
+        "CREATE INDEX IF NOT EXISTS idx_streams_group ON streams (group_id)",
+        "CREATE INDEX IF NOT EXISTS idx_stream_groups_user ON stream_groups (user_id)",
+    ]),
+    # Platform-ready encodes of a blob, made in the background after upload
+    (11, 'renditions', [
+        '''
+        CREATE TABLE IF NOT EXISTS renditions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            checksum TEXT NOT NULL,
+            profile TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            file_size INTEGER,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (checksum, profile)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_renditions_status ON renditions (status)",
+    ]),
+    # Persistent background work, claimed by the JobQueue worker pool
+    (12, 'jobs', [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT,
+            ref TEXT,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            progress REAL NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority, id)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_ref ON jobs (ref, status)",
+    ]),
+    # Range scan of upcoming starts for the stream scheduler
+    (13, 'stream schedule index', [
+        "CREATE INDEX IF NOT EXISTS idx_streams_status_scheduled ON streams (status, scheduled_time)",
+    ]),
+    # Milliseconds between scheduled_time and the ffmpeg launch
+    (14, 'stream start latency', [
+        "ALTER TABLE streams ADD COLUMN start_latency_ms INTEGER",
+    ]),
+    # ffmpeg output of streams (stream_id) and group encodes (group_id)
+    (15, 'stream logs', [
+        '''
+        CREATE TABLE IF NOT EXISTS stream_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stream_id INTEGER,
+            group_id INTEGER,
+            created_at TIMESTAMP NOT NULL,
+            message TEXT NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_stream_logs_stream ON stream_logs (stream_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_stream_logs_group ON stream_logs (group_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_stream_logs_created ON stream_logs (created_at)",
+    ]),
+    # CPU cores used per kind of output, measured by the capacity planner
+    (16, 'measured stream cpu cost', [
+        '''
+        CREATE TABLE IF NOT EXISTS stream_costs (
+            cost_class TEXT PRIMARY KEY,
+            cores REAL NOT NULL,
+            samples INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+_lock = threading.Lock()
+_migrated_paths = set()
+
+
+def current_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    """Apply pending migrations to a connection, one transaction per step"""
+    with _lock:
+        version = current_version(conn)
+        for step, description, statements in MIGRATIONS:
+            if step <= version:
+                continue
+            try:
+                conn.execute("BEGIN")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (step, description)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            version = step
+        return version
+
+
+def migrate_storage(storage):
+    """Bring a StorageEngine database up to date once per process"""
+    if storage.path in _migrated_paths:
+        return LATEST_VERSION
+    with storage.writer() as conn:
+        version = migrate(conn)
+    _migrated_paths.add(storage.path)
+    return version
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = float(os.environ.get('STREAMFLOW_CACHE_TTL', '30'))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('STREAMFLOW_CACHE_ENTRIES', '2048'))
+
+
+class QueryCache:
+    """LRU cache of read-query results keyed by (query, user_id).
+
+    Entries expire after a TTL and are dropped early when a write helper
+    calls invalidate_user() for the affected user. A per-user generation
+    number keeps a load that raced with a write from caching stale rows.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, query, user_id, loader, ttl=None):
+        """Return the cached result for (query, user_id), running loader() on a miss"""
+        key = (query, user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation(user_id)
+
+        value = loader()
+
+        with self._lock:
+            if self._generation(user_id) == generation:
+                self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+                self._entries.move_to_end(key)
+                self._keys_by_user.setdefault(user_id, set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    old_key, _ = self._entries.popitem(last=False)
+                    self._forget(old_key)
+                    self.evictions += 1
+        return value
+
+    def invalidate_user(self, user_id):
+        """Drop every cached result for one user after a write"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _generation(self, user_id):
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def _forget(self, key):
+        keys = self._keys_by_user.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[1]]
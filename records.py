@@ -0,0 +1,125 @@
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+
+def parse_timestamp(value):
+    """SQLite TIMESTAMP text ('YYYY-MM-DD HH:MM:SS') to datetime"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def format_timestamp(value):
+    """datetime back to the text form SQLite stores, for query parameters"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+class Record:
+    """Shared row mapping for the slotted record types below"""
+
+    __slots__ = ()
+    TIMESTAMP_FIELDS = ('created_at',)
+
+    @classmethod
+    def from_columns(cls, names, values):
+        """Build a record from the columns it declares; any others are ignored.
+
+        SELECT * and RETURNING * reads keep working when a migration adds a
+        column the record does not know yet.
+        """
+        known = cls.__dataclass_fields__
+        data = {name: value for name, value in zip(names, values) if name in known}
+        for name in cls.TIMESTAMP_FIELDS:
+            if name in data:
+                data[name] = parse_timestamp(data[name])
+        return cls(**data)
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """sqlite3 row factory building a record from the selected columns"""
+        return cls.from_columns([column[0] for column in cursor.description], row)
+
+    def to_dict(self):
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+@dataclass(slots=True)
+class User(Record):
+    id: int = None
+    username: str = None
+    email: str = None
+    password_hash: str = None
+    avatar_path: str = None
+    created_at: datetime = None
+
+
+@dataclass(slots=True)
+class Video(Record):
+    id: int = None
+    user_id: int = None
+    filename: str = None
+    original_name: str = None
+    file_path: str = None
+    thumbnail_path: str = None
+    duration: int = None
+    file_size: int = None
+    created_at: datetime = None
+    resolution: str = None
+    bitrate: int = None
+    fps: str = None
+    checksum: str = None
+    video_codec: str = None
+    audio_codec: str = None
+    keyframe_interval: float = None
+
+
+@dataclass(slots=True)
+class Stream(Record):
+    TIMESTAMP_FIELDS = ('created_at', 'scheduled_time', 'start_time', 'end_time')
+
+    id: int = None
+    user_id: int = None
+    title: str = None
+    platform: str = None
+    stream_key: str = None
+    video_id: int = None
+    status: str = 'pending'
+    scheduled_time: datetime = None
+    created_at: datetime = None
+    bitrate: int = None
+    resolution: str = None
+    fps: int = None
+    loop_video: int = 1
+    start_time: datetime = None
+    end_time: datetime = None
+    group_id: int = None
+    start_latency_ms: int = None
+
+
+@dataclass(slots=True)
+class Job(Record):
+    TIMESTAMP_FIELDS = ('created_at', 'run_after', 'updated_at')
+
+    id: int = None
+    kind: str = None
+    payload: str = None
+    ref: str = None
+    priority: int = None
+    status: str = 'queued'
+    attempts: int = 0
+    max_attempts: int = 3
+    run_after: datetime = None
+    progress: float = 0.0
+    error: str = None
+    created_at: datetime = None
+    updated_at: datetime = None
+
+
+@dataclass(slots=True)
+class StreamGroup(Record):
+    id: int = None
+    user_id: int = None
+    title: str = None
+    created_at: datetime = None
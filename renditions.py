@@ -0,0 +1,203 @@
+import os
+import subprocess
+import tempfile
+
+from jobs import PRIORITY_BACKGROUND, JobCancelled
+from streaming_engine import FFMPEG_PATH
+from video_storage import remove_file
+
+# Platform-ready encodes made once at upload: H.264/AAC with a fixed
+# two-second GOP, so a live push is always a stream copy
+RENDITION_PROFILES = {
+    'landscape_720p30': {'resolution': '1280x720', 'fps': 30, 'bitrate': 2500},
+    'vertical_1080x1920': {'resolution': '1080x1920', 'fps': 30, 'bitrate': 4000},
+}
+VERTICAL_PLATFORMS = ('TikTok', 'Instagram')
+
+
+def rendition_profile(platform):
+    """Name of the rendition pushed to a platform"""
+    return 'vertical_1080x1920' if platform in VERTICAL_PLATFORMS else 'landscape_720p30'
+
+
+def rendition_media(profile):
+    """What a rendition looks like to media_probe.choose_mode()"""
+    settings = RENDITION_PROFILES[profile]
+    return {
+        'video_codec': 'h264',
+        'audio_codec': 'aac',
+        'resolution': settings['resolution'],
+        'fps': settings['fps'],
+        'bitrate': settings['bitrate'],
+        'keyframe_interval': 2.0,
+    }
+
+
+def build_rendition_args(input_path, output_path, profile):
+    """ffmpeg arguments encoding one rendition to an MP4 file"""
+    settings = RENDITION_PROFILES[profile]
+    width, height = settings['resolution'].split('x')
+    fps, bitrate = settings['fps'], settings['bitrate']
+    return [
+        '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+        '-i', input_path,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', (
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+        ),
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-b:v', f'{bitrate}k',
+        '-maxrate', f'{int(bitrate * 1.5)}k',
+        '-bufsize', f'{bitrate * 2}k',
+        '-pix_fmt', 'yuv420p',
+        '-r', str(fps),
+        # Keyframe exactly every two seconds, never on scene cuts
+        '-g', str(fps * 2),
+        '-keyint_min', str(fps * 2),
+        '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', '128k', '-ar', '44100',
+        '-movflags', '+faststart',
+        '-f', 'mp4', output_path,
+    ]
+
+
+class RenditionStore:
+    """Platform-ready renditions of uploaded videos, encoded as background jobs.
+
+    Renditions belong to the stored blob (its checksum), not to a videos
+    row, so deduplicated uploads share them; they are written next to the
+    blob and tracked in the renditions table. Each one is a 'rendition'
+    job on the JobQueue, reporting progress from ffmpeg's -progress output.
+    """
+
+    def __init__(self, storage, jobs, ffmpeg_path=FFMPEG_PATH, profiles=None):
+        self.storage = storage
+        self.jobs = jobs
+        self.ffmpeg_path = ffmpeg_path
+        self.profiles = list(profiles or RENDITION_PROFILES)
+        # Share the cores between the workers instead of oversubscribing them
+        self.threads = max(1, (os.cpu_count() or 1) // max(1, jobs.workers))
+        jobs.register('rendition', self._encode, on_cancel=self._cancelled)
+
+    def enqueue(self, checksum, source_path, priority=PRIORITY_BACKGROUND):
+        """Queue a job for every missing, failed or cancelled rendition of a blob.
+
+        A 'pending' row without a queued or running job (its job failed
+        outside the handler, say) is queued again as well.
+        """
+        base = os.path.splitext(source_path)[0]
+        created = []
+        with self.storage.writer() as conn:
+            for profile in self.profiles:
+                row = conn.execute(
+                    "INSERT INTO renditions (checksum, profile, file_path) VALUES (?, ?, ?) "
+                    "ON CONFLICT (checksum, profile) DO UPDATE SET status = 'pending', error = NULL "
+                    "WHERE status IN ('error', 'cancelled') OR (status = 'pending' AND NOT EXISTS ("
+                    "SELECT 1 FROM jobs WHERE ref = renditions.checksum AND status IN ('queued', 'running') "
+                    "AND kind = 'rendition' AND json_extract(payload, '$.rendition_id') = renditions.id)) "
+                    "RETURNING id",
+                    (checksum, profile, f"{base}.{profile}.mp4")
+                ).fetchone()
+                if row is not None:
+                    created.append(row[0])
+        for rendition_id in created:
+            self.jobs.submit('rendition', {'rendition_id': rendition_id}, ref=checksum, priority=priority)
+        return len(created)
+
+    def ready_path(self, checksum, profile):
+        row = self.storage.fetchone(
+            "SELECT file_path FROM renditions WHERE checksum = ? AND profile = ? AND status = 'ready'",
+            (checksum, profile)
+        )
+        if row is None or not os.path.isfile(row[0]):
+            return None
+        return row[0]
+
+    def statuses(self, checksums):
+        """{checksum: {profile: status}} for a page of videos, in one query"""
+        checksums = [checksum for checksum in checksums if checksum]
+        if not checksums:
+            return {}
+        rows = self.storage.fetchall(
+            f"SELECT checksum, profile, status FROM renditions WHERE checksum IN ({', '.join('?' * len(checksums))})",
+            checksums
+        )
+        result = {}
+        for checksum, profile, status in rows:
+            result.setdefault(checksum, {})[profile] = status
+        return result
+
+    def _encode(self, running):
+        row = self.storage.fetchone(
+            "SELECT r.id, r.checksum, r.profile, r.file_path, r.status, b.file_path, "
+            "(SELECT MAX(duration) FROM videos v WHERE v.checksum = r.checksum) "
+            "FROM renditions r JOIN video_blobs b ON b.checksum = r.checksum WHERE r.id = ?",
+            (running.payload['rendition_id'],)
+        )
+        # Deleted with its blob, or already finished by an earlier attempt
+        if row is None or row[4] == 'ready':
+            return
+        rendition_id, _, profile, output_path, status, source_path, duration = row
+        if status != 'pending':
+            self._set_status(rendition_id, 'pending', None)
+        try:
+            self._transcode(running, source_path, output_path, profile, duration)
+        except JobCancelled:
+            self._set_status(rendition_id, 'cancelled', None)
+            raise
+        except (OSError, RuntimeError) as e:
+            self._set_status(rendition_id, 'error', str(e))
+            raise
+        with self.storage.writer() as conn:
+            updated = conn.execute(
+                "UPDATE renditions SET status = 'ready', file_size = ?, error = NULL, updated_at = CURRENT_TIMESTAMP "
+                "WHERE id = ? RETURNING id",
+                (os.path.getsize(output_path), rendition_id)
+            ).fetchone()
+        if updated is None:
+            # The blob was released while encoding
+            remove_file(output_path)
+
+    def _transcode(self, running, source_path, output_path, profile, duration):
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), prefix='.rendition-', suffix='.mp4')
+        os.close(fd)
+        args = [self.ffmpeg_path, '-progress', 'pipe:1', '-nostats', '-threads', str(self.threads)]
+        args += build_rendition_args(source_path, temp_path, profile)
+        try:
+            with tempfile.TemporaryFile() as stderr:
+                process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr)
+                try:
+                    for line in process.stdout:
+                        key, _, value = line.decode('ascii', 'replace').strip().partition('=')
+                        if key == 'out_time_us' and duration and value.isdigit():
+                            running.report(int(value) / 1_000_000 / duration)
+                        if running.cancelled:
+                            process.terminate()
+                            break
+                finally:
+                    returncode = process.wait()
+                running.check_cancelled()
+                if returncode != 0:
+                    stderr.seek(0)
+                    message = stderr.read().decode('utf-8', 'replace').strip()[-500:]
+                    raise RuntimeError(message or f"ffmpeg exited with {returncode}")
+            os.replace(temp_path, output_path)
+        except BaseException:
+            remove_file(temp_path)
+            raise
+
+    def _cancelled(self, payload):
+        """A rendition job was cancelled before it started"""
+        self.storage.execute(
+            "UPDATE renditions SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND status = 'pending'",
+            (payload.get('rendition_id'),)
+        )
+
+    def _set_status(self, rendition_id, status, error):
+        self.storage.execute(
+            "UPDATE renditions SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (status, error, rendition_id)
+        )
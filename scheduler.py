@@ -0,0 +1,203 @@
+import heapq
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from records import format_timestamp, parse_timestamp
+from streaming_engine import StreamError
+
+logger = logging.getLogger(__name__)
+
+# Only streams due within this window are kept in memory; the window is
+# reloaded from the index every HORIZON / 2
+HORIZON = timedelta(hours=1)
+# Streams missed by up to this much (e.g. during a restart) still start
+GRACE = timedelta(minutes=5)
+# Input checks, cache warming and argument building run this far ahead
+PREROLL = timedelta(seconds=int(os.environ.get('STREAMFLOW_PREROLL_SECONDS', '30')))
+# A failed load of the window is retried after this long
+LOAD_RETRY = timedelta(seconds=30)
+# Pre-rolls running at once; each may wait on ffprobe, the disk and DNS
+PREROLL_WORKERS = int(os.environ.get('STREAMFLOW_PREROLL_WORKERS', '4'))
+
+
+class StreamScheduler:
+    """Starts pending streams at their scheduled_time.
+
+    Python counterpart of services/schedulerService.js, without polling the
+    table every minute: upcoming start times sit in a min-heap and a single
+    thread sleeps until the earliest one. The heap only holds the next
+    HORIZON, loaded with an index range scan on (status, scheduled_time),
+    and schedule()/cancel() keep it current when streams are created or
+    deleted. Cancelled or rescheduled entries are skipped lazily when they
+    reach the top of the heap.
+
+    Each stream gets two entries: a pre-roll PREROLL ahead that lets the
+    service do the slow preparation, and the start itself. Pre-rolls run
+    in a pool of PREROLL_WORKERS threads, so a slow probe or DNS answer
+    never holds up the starts behind it on this thread. How late each
+    stream actually went live is stored in streams.start_latency_ms.
+    Starts the host has no capacity for are queued by the service.
+    """
+
+    def __init__(self, storage, service, clock=datetime.now):
+        self.storage = storage
+        self.service = service
+        self.clock = clock
+        self._heap = []
+        self._due = {}
+        self._loaded_until = None
+        self._reload_at = None
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._prerolls = {}
+        self._preroll_pool = ThreadPoolExecutor(PREROLL_WORKERS, thread_name_prefix='stream-preroll')
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stream-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        self._preroll_pool.shutdown(wait=False, cancel_futures=True)
+
+    def schedule(self, stream_id, scheduled_time):
+        """Add or move a stream's start; beyond the loaded window it waits for the next load"""
+        scheduled_time = parse_timestamp(scheduled_time)
+        with self._wakeup:
+            self._due.pop(stream_id, None)
+            if scheduled_time is None or self._loaded_until is None:
+                return
+            if not self.clock() - GRACE <= scheduled_time <= self._loaded_until:
+                return
+            self._push(stream_id, scheduled_time)
+            self._wakeup.notify()
+
+    def cancel(self, stream_id):
+        with self._wakeup:
+            self._due.pop(stream_id, None)
+
+    def pending(self):
+        """Number of starts currently held in memory"""
+        with self._wakeup:
+            return len(self._due)
+
+    def _push(self, stream_id, scheduled_time):
+        self._due[stream_id] = scheduled_time
+        heapq.heappush(self._heap, (scheduled_time - PREROLL, scheduled_time, 'prepare', stream_id))
+        heapq.heappush(self._heap, (scheduled_time, scheduled_time, 'start', stream_id))
+
+    def _load(self, now):
+        until = now + HORIZON
+        rows = self.storage.fetchall(
+            "SELECT id, scheduled_time FROM streams "
+            "WHERE status = 'pending' AND scheduled_time >= ? AND scheduled_time <= ?",
+            (format_timestamp(now - GRACE), format_timestamp(until))
+        )
+        with self._wakeup:
+            for stream_id, scheduled_time in rows:
+                scheduled_time = parse_timestamp(scheduled_time)
+                if self._due.get(stream_id) != scheduled_time:
+                    self._push(stream_id, scheduled_time)
+            self._loaded_until = until
+            self._reload_at = now + HORIZON / 2
+
+    def _next_due(self, now):
+        """Pop every entry due by now; returns (due entries, seconds to sleep)"""
+        due = []
+        with self._wakeup:
+            while self._heap and self._heap[0][0] <= now:
+                _, scheduled_time, action, stream_id = heapq.heappop(self._heap)
+                if self._due.get(stream_id) != scheduled_time:
+                    continue
+                if action == 'start':
+                    del self._due[stream_id]
+                due.append((action, stream_id, scheduled_time))
+            wake_at = min(self._heap[0][0], self._reload_at) if self._heap else self._reload_at
+        return due, max(0.0, (wake_at - now).total_seconds())
+
+    def _run(self):
+        # Errors are logged per load and per entry: this one thread starts
+        # the streams of every user, so it must not die with one of them
+        while True:
+            now = self.clock()
+            if self._reload_at is None or now >= self._reload_at:
+                try:
+                    self._load(now)
+                except Exception:
+                    logger.exception("Could not load scheduled streams, retrying in %s", LOAD_RETRY)
+                    with self._wakeup:
+                        self._reload_at = now + LOAD_RETRY
+            due, timeout = self._next_due(now)
+            for action, stream_id, scheduled_time in due:
+                try:
+                    if action == 'prepare':
+                        self._prepare(stream_id)
+                    else:
+                        self._fire(stream_id, scheduled_time)
+                except Exception:
+                    logger.exception("Scheduled %s of stream %s failed", action, stream_id)
+            if due:
+                continue
+            with self._wakeup:
+                if self._stopping:
+                    return
+                self._wakeup.wait(timeout)
+                if self._stopping:
+                    return
+
+    def _prepare(self, stream_id):
+        future = self._preroll_pool.submit(self._preroll, stream_id)
+        with self._wakeup:
+            # Pre-rolls of streams deleted or moved since are no longer needed
+            for other, done in list(self._prerolls.items()):
+                if done.done() and other not in self._due:
+                    del self._prerolls[other]
+            self._prerolls[stream_id] = future
+
+    def _preroll(self, stream_id):
+        try:
+            self.service.prepare_stream(stream_id)
+        except StreamError as e:
+            # The start itself still runs and records the failure
+            logger.warning("Pre-roll of stream %s failed: %s", stream_id, e)
+        except Exception:
+            logger.exception("Pre-roll of stream %s failed", stream_id)
+
+    def _fire(self, stream_id, scheduled_time):
+        with self._wakeup:
+            preroll = self._prerolls.pop(stream_id, None)
+        try:
+            self._start(stream_id, scheduled_time)
+        finally:
+            # A pre-roll still running when its start fired would otherwise
+            # leave its result for some later start of the stream
+            if preroll is not None:
+                preroll.add_done_callback(lambda _: self.service.discard_prepared(stream_id))
+
+    def _start(self, stream_id, scheduled_time):
+        # The row may have been started by hand, deleted or rescheduled
+        row = self.storage.fetchone(
+            "SELECT status FROM streams WHERE id = ?", (stream_id,)
+        )
+        if row is None or row[0] != 'pending':
+            self.service.discard_prepared(stream_id)
+            return
+        try:
+            started = self.service.start_stream(stream_id, queue=True)
+        except StreamError:
+            # Nobody is watching: leave the failure on the row
+            self.service.set_status(stream_id, 'error', only_if='pending')
+            return
+        if not started:
+            # Waiting for capacity; the latency is recorded when it starts
+            return
+        latency_ms = int((self.clock() - scheduled_time).total_seconds() * 1000)
+        self.service.record_start_latency(stream_id, latency_ms)
+        logger.info("Scheduled stream %s went live %d ms after its start time", stream_id, latency_ms)
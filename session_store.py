@@ -0,0 +1,97 @@
+from itertools import islice
+
+from ids import IdAllocator
+
+
+class SessionStore:
+    """In-memory users, videos and streams for the session-state apps.
+
+    Records live in dicts keyed by id, with secondary indexes by username,
+    email, user_id and (user_id, status), so lookups, uniqueness checks,
+    status changes, deletes and dashboard counts never scan a list.
+    Per-user indexes keep insertion order, which is creation order. Records
+    are the slotted User/Video/Stream types from records.py.
+    """
+
+    def __init__(self, allocator=None):
+        self.ids = allocator or IdAllocator()
+        self.users = {}
+        self.videos = {}
+        self.streams = {}
+        self._users_by_username = {}
+        self._users_by_email = {}
+        self._videos_by_user = {}
+        self._streams_by_user = {}
+        self._streams_by_user_status = {}
+
+    # Users
+    def add_user(self, user):
+        """Insert a user; returns None when the username or email is taken"""
+        if user.username in self._users_by_username or user.email in self._users_by_email:
+            return None
+        user.id = self.ids.next_id()
+        self.users[user.id] = user
+        self._users_by_username[user.username] = user
+        self._users_by_email[user.email] = user
+        return user
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def find_user_by_username(self, username):
+        return self._users_by_username.get(username)
+
+    # Videos
+    def add_video(self, video):
+        video.id = self.ids.next_id()
+        self.videos[video.id] = video
+        self._videos_by_user.setdefault(video.user_id, {})[video.id] = video
+        return video
+
+    def delete_video(self, video_id):
+        video = self.videos.pop(video_id, None)
+        if video is not None:
+            self._videos_by_user[video.user_id].pop(video_id, None)
+        return video
+
+    def user_videos(self, user_id):
+        return list(self._videos_by_user.get(user_id, {}).values())
+
+    def count_user_videos(self, user_id):
+        return len(self._videos_by_user.get(user_id, ()))
+
+    # Streams
+    def add_stream(self, stream):
+        stream.id = self.ids.next_id()
+        self.streams[stream.id] = stream
+        self._streams_by_user.setdefault(stream.user_id, {})[stream.id] = stream
+        self._streams_by_user_status.setdefault((stream.user_id, stream.status), {})[stream.id] = stream
+        return stream
+
+    def set_stream_status(self, stream_id, status):
+        stream = self.streams.get(stream_id)
+        if stream is None or stream.status == status:
+            return stream
+        self._streams_by_user_status[(stream.user_id, stream.status)].pop(stream_id, None)
+        stream.status = status
+        self._streams_by_user_status.setdefault((stream.user_id, status), {})[stream_id] = stream
+        return stream
+
+    def delete_stream(self, stream_id):
+        stream = self.streams.pop(stream_id, None)
+        if stream is not None:
+            self._streams_by_user[stream.user_id].pop(stream_id, None)
+            self._streams_by_user_status[(stream.user_id, stream.status)].pop(stream_id, None)
+        return stream
+
+    def user_streams(self, user_id):
+        return list(self._streams_by_user.get(user_id, {}).values())
+
+    def recent_streams(self, user_id, limit=5):
+        streams = self._streams_by_user.get(user_id, {})
+        return list(islice(reversed(streams.values()), limit))
+
+    def count_user_streams(self, user_id, status=None):
+        if status is None:
+            return len(self._streams_by_user.get(user_id, ()))
+        return len(self._streams_by_user_status.get((user_id, status), ()))
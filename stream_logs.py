@@ -0,0 +1,141 @@
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between batched inserts
+FLUSH_INTERVAL = 2.0
+# Per stream: sustained lines per second, and the burst allowed above it
+RATE_PER_SECOND = 10.0
+RATE_BURST = 50
+# Lines waiting for the next flush; beyond this new lines are dropped
+MAX_PENDING = 5000
+# Persisted lines older than this are pruned about once an hour
+RETENTION_DAYS = 7
+PRUNE_INTERVAL = 3600.0
+
+
+def log_time(timestamp):
+    """A line's epoch timestamp in the form stream_logs.created_at stores"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+class _TokenBucket:
+    __slots__ = ('tokens', 'updated_at', 'dropped')
+
+    def __init__(self, now):
+        self.tokens = float(RATE_BURST)
+        self.updated_at = now
+        self.dropped = 0
+
+
+class StreamLogWriter:
+    """Rate-limited, batched persistence of ffmpeg output to stream_logs.
+
+    write() runs on the engine's event-loop thread (every stderr line) and
+    in its callback pool, so it must never block and never touches the
+    database: lines go into a bounded pending list and a single flusher
+    thread inserts them with one executemany per FLUSH_INTERVAL. Each
+    stream has a token bucket, so a noisy encoder cannot flood the table;
+    lines over the limit are counted and reported as one summary line.
+    """
+
+    def __init__(self, storage, flush_interval=FLUSH_INTERVAL):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._buckets = {}
+        self._overflow = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._pruned_at = 0.0
+        threading.Thread(target=self._run, name='stream-log-writer', daemon=True).start()
+
+    def write(self, key, timestamp, message):
+        """Queue one line for a stream id or a ('group', id) key"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _TokenBucket(timestamp)
+            bucket.tokens = min(RATE_BURST, bucket.tokens + (timestamp - bucket.updated_at) * RATE_PER_SECOND)
+            bucket.updated_at = timestamp
+            if bucket.tokens < 1:
+                bucket.dropped += 1
+                return
+            bucket.tokens -= 1
+            if len(self._pending) >= MAX_PENDING:
+                self._overflow += 1
+                return
+            if bucket.dropped:
+                self._pending.append(self._row(key, timestamp, f"[{bucket.dropped} baris dilewati karena batas laju log]"))
+                bucket.dropped = 0
+            self._pending.append(self._row(key, timestamp, message))
+
+    def forget(self, key):
+        """Drop a stream's rate-limit state once it has stopped"""
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    @staticmethod
+    def _row(key, timestamp, message):
+        stream_id, group_id = (None, key[1]) if isinstance(key, tuple) else (key, None)
+        return (stream_id, group_id, log_time(timestamp), message)
+
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+            overflow, self._overflow = self._overflow, 0
+        if overflow:
+            rows.append((None, None, time.strftime('%Y-%m-%d %H:%M:%S'), f"[{overflow} baris log hilang, antrean penuh]"))
+        if not rows:
+            return 0
+        with self.storage.writer() as conn:
+            conn.executemany(
+                "INSERT INTO stream_logs (stream_id, group_id, created_at, message) VALUES (?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def recent(self, stream_id, group_id=None, limit=200):
+        """Newest persisted lines of a stream (and its group encode), oldest first"""
+        if group_id is None:
+            rows = self.storage.fetchall(
+                "SELECT created_at, message FROM stream_logs WHERE stream_id = ? ORDER BY id DESC LIMIT ?",
+                (stream_id, limit)
+            )
+            return rows[::-1]
+        # An OR over both columns plans as a multi-index OR plus a temp
+        # B-tree sort; each LIMIT subquery walks its own index backwards
+        rows = self.storage.fetchall(
+            "SELECT id, created_at, message FROM ("
+            "SELECT * FROM (SELECT id, created_at, message FROM stream_logs WHERE stream_id = ? "
+            "ORDER BY id DESC LIMIT ?) "
+            "UNION ALL "
+            "SELECT * FROM (SELECT id, created_at, message FROM stream_logs WHERE group_id = ? "
+            "ORDER BY id DESC LIMIT ?)"
+            ") ORDER BY id DESC LIMIT ?",
+            (stream_id, limit, group_id, limit, limit)
+        )
+        return [(created_at, message) for _, created_at, message in reversed(rows)]
+
+    def _prune(self):
+        self.storage.execute(
+            "DELETE FROM stream_logs WHERE created_at < datetime('now', 'localtime', ?)",
+            (f'-{RETENTION_DAYS} days',)
+        )
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+                    self._pruned_at = time.monotonic()
+                    self._prune()
+            except sqlite3.Error as e:
+                # The batch is lost, the writer keeps running
+                logger.warning("Could not persist stream logs: %s", e)
+
+    def shutdown(self):
+        self._stopping.set()
+        self.flush()
@@ -0,0 +1,670 @@
+import asyncio
+import logging
+import math
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from telemetry import MetricsRing, parse_progress
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH') or shutil.which('ffmpeg') or 'ffmpeg'
+FFMPEG_LOGLEVEL = os.environ.get('STREAMFLOW_FFMPEG_LOGLEVEL', 'warning')
+MAX_LOG_LINES = 100
+# Longest stdout/stderr line kept from ffmpeg; longer ones are dropped
+PIPE_LINE_LIMIT = 1024 * 1024
+# Threads for callbacks that may block, such as status writes on exit
+CALLBACK_WORKERS = 4
+# Stopping a stream: seconds to wait after sending 'q', then after SIGTERM,
+# before the process group is killed
+STOP_QUIT_TIMEOUT = float(os.environ.get('STREAMFLOW_STOP_QUIT_SECONDS', '3'))
+STOP_TERM_TIMEOUT = float(os.environ.get('STREAMFLOW_STOP_TERM_SECONDS', '2'))
+# Upper bound for stopping every stream when the app shuts down
+SHUTDOWN_TIMEOUT = float(os.environ.get('STREAMFLOW_SHUTDOWN_SECONDS', '10'))
+# Environment markers on every ffmpeg, so a restarted server can find the
+# encoders of its own database and tell which stream each one belongs to
+INSTANCE_ENV = 'STREAMFLOW_INSTANCE'
+STREAM_ENV = 'STREAMFLOW_STREAM'
+# Exit check for adopted processes where pidfds are unavailable
+ADOPT_POLL_INTERVAL = 1.0
+
+# Stream keys may only name RTMP ingest URLs; anything else ffmpeg can open
+# (files, http://, tcp://) would let users write to the server or reach
+# internal services
+OUTPUT_SCHEMES = ('rtmp', 'rtmps')
+# Operators can allow absolute file paths as stream keys, for testing the
+# engine against a local sink
+ALLOW_FILE_OUTPUT = os.environ.get('STREAMFLOW_ALLOW_FILE_OUTPUT') == '1'
+
+# Ingest endpoints for platforms with a fixed RTMP server. TikTok, Instagram
+# and Custom RTMP need the full URL in the stream key field.
+PLATFORM_RTMP_URLS = {
+    'YouTube': 'rtmp://a.rtmp.youtube.com/live2',
+    'Facebook': 'rtmps://live-api-s.facebook.com:443/rtmp',
+    'Twitch': 'rtmp://live.twitch.tv/app',
+}
+
+
+class StreamError(Exception):
+    """A stream could not be started or controlled"""
+
+
+def resolve_output_url(platform, stream_key):
+    """Full output target for a stream row.
+
+    A key that already is an rtmp:// or rtmps:// URL is used as is. An
+    absolute file path is only accepted with STREAMFLOW_ALLOW_FILE_OUTPUT=1.
+    """
+    if '://' in stream_key:
+        if stream_key.split('://', 1)[0].lower() not in OUTPUT_SCHEMES:
+            raise StreamError("Stream Key hanya boleh berupa URL rtmp:// atau rtmps://")
+        _split_url(stream_key)
+        return stream_key
+    if os.path.isabs(stream_key):
+        if not ALLOW_FILE_OUTPUT:
+            raise StreamError("Output ke file lokal tidak diizinkan di server ini")
+        return stream_key
+    base_url = PLATFORM_RTMP_URLS.get(platform)
+    if base_url is None:
+        raise StreamError(f"{platform} membutuhkan URL RTMP lengkap di kolom Stream Key")
+    return f"{base_url.rstrip('/')}/{stream_key}"
+
+
+def _split_url(url):
+    """urlsplit() with its port checked; a malformed URL raises StreamError"""
+    try:
+        parts = urlsplit(url)
+        # Parsed lazily, so an out-of-range port only fails here
+        parts.port
+    except ValueError as e:
+        # The URL holds the stream key, so it is not repeated in the message
+        raise StreamError(f"URL RTMP tidak valid: {e}") from e
+    if '://' in url and not parts.hostname:
+        raise StreamError("URL RTMP tidak memiliki nama server")
+    return parts
+
+
+def resolve_endpoint(output_url):
+    """Look up the ingest host of an RTMP URL ahead of the start.
+
+    Catches a mistyped server before the scheduled time and warms the
+    resolver cache; file targets and URLs without a host are skipped.
+    """
+    parts = _split_url(output_url)
+    if not parts.hostname:
+        return None
+    port = parts.port or (443 if parts.scheme == 'rtmps' else 1935)
+    try:
+        return socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)[0][4]
+    except (socket.gaierror, UnicodeError) as e:
+        # UnicodeError: a host name the IDNA codec rejects, e.g. a too long label
+        raise StreamError(f"Server RTMP tidak ditemukan: {parts.hostname}") from e
+
+
+def tee_target(output_urls):
+    """tee muxer spec pushing one encode to every URL.
+
+    onfail=ignore keeps the other destinations live when one of them drops.
+    """
+    slaves = []
+    for url in output_urls:
+        for char in '\\|[]':
+            url = url.replace(char, '\\' + char)
+        slaves.append(f"[f=flv:onfail=ignore]{url}")
+    return '|'.join(slaves)
+
+
+def build_ffmpeg_args(input_path, output_url, loop=True, mode='copy', resolution=None, bitrate=None, fps=None,
+                      start_at=None):
+    """ffmpeg arguments for one stream, mirroring buildFFmpegArgs in streamingService.js.
+
+    output_url may be a list, in which case the input is read and encoded
+    once and fanned out to every URL through the tee muxer. start_at seeks
+    the input, to resume a restarted stream where it stopped.
+    """
+    args = [
+        # No -nostdin: the engine stops ffmpeg by sending 'q' on stdin
+        '-hide_banner',
+        '-loglevel', FFMPEG_LOGLEVEL,
+        # Machine-readable progress on stdout, read by the engine
+        '-progress', 'pipe:1', '-nostats',
+        '-re',
+        '-fflags', '+genpts+igndts',
+        '-stream_loop', '-1' if loop else '0',
+    ]
+    if start_at:
+        args += ['-ss', f'{start_at:.3f}']
+    args += ['-i', input_path]
+    if mode == 'copy':
+        args += ['-c:v', 'copy', '-c:a', 'copy']
+    else:
+        bitrate = bitrate or 2500
+        fps = fps or 30
+        args += [
+            '-c:v', 'libx264',
+            '-preset', 'veryfast',
+            '-b:v', f'{bitrate}k',
+            '-maxrate', f'{int(bitrate * 1.5)}k',
+            '-bufsize', f'{bitrate * 2}k',
+            '-pix_fmt', 'yuv420p',
+            '-g', str(int(fps) * 2),
+            '-s', resolution or '1280x720',
+            '-r', str(fps),
+            '-c:a', 'aac',
+            '-b:a', '128k',
+            '-ar', '44100',
+        ]
+    if isinstance(output_url, (list, tuple)):
+        if len(output_url) > 1:
+            args += ['-map', '0:v', '-map', '0:a?']
+            if mode != 'copy':
+                # FLV slaves need the codec headers up front when encoding
+                args += ['-flags', '+global_header']
+            args += ['-f', 'tee', tee_target(output_url)]
+            return args
+        output_url = output_url[0]
+    args += ['-f', 'flv', output_url]
+    return args
+
+
+class StreamProcess:
+    """One running ffmpeg output and what the engine knows about it"""
+
+    def __init__(self, stream_id, process, args, start_at=0.0, metrics=None, logs=None):
+        self.stream_id = stream_id
+        self.process = process
+        self.args = args
+        self.started_at = time.time()
+        self.stop_requested = False
+        # Killed by the engine's owner to be restarted, not stopped
+        self.aborted = False
+        self.logs = logs if logs is not None else deque(maxlen=MAX_LOG_LINES)
+        # Input offset this run started from, and media seconds sent since
+        self.start_at = start_at or 0.0
+        self.position = 0.0
+        self.last_progress_at = self.started_at
+        self.metrics = metrics if metrics is not None else MetricsRing()
+        self.task = None
+        # Started by an earlier server: no pipes, no progress, no exit code
+        self.adopted = False
+
+    @property
+    def pid(self):
+        return self.process.get_pid()
+
+
+def stream_marker(key):
+    """STREAM_ENV value for an engine key: '12' or 'group:3'"""
+    return f"group:{key[1]}" if isinstance(key, tuple) else str(key)
+
+
+def parse_stream_marker(value):
+    if value.startswith('group:'):
+        return ('group', int(value[len('group:'):]))
+    return int(value)
+
+
+def _proc_stat(pid):
+    """(state, ppid, pgid) of a process from /proc, or None if it is gone"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            fields = f.read().rsplit(b')', 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    return fields[0].decode(), int(fields[1]), int(fields[2])
+
+
+def _process_alive(pid):
+    stat = _proc_stat(pid)
+    return stat is not None and stat[0] not in ('Z', 'X')
+
+
+def find_orphans(instance):
+    """[(pid, ppid, key)] of running ffmpeg outputs tagged with this instance.
+
+    Only group leaders count: anything ffmpeg spawned inherits the markers
+    but goes with its group. Empty where /proc is not available.
+    """
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return []
+    instance_item = f"{INSTANCE_ENV}={instance}".encode()
+    stream_prefix = f"{STREAM_ENV}=".encode()
+    found = []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        try:
+            with open(f'/proc/{pid}/environ', 'rb') as f:
+                environ = f.read().split(b'\0')
+        except OSError:
+            continue
+        if instance_item not in environ:
+            continue
+        stat = _proc_stat(pid)
+        if stat is None or stat[0] in ('Z', 'X') or stat[2] != pid:
+            continue
+        for item in environ:
+            if item.startswith(stream_prefix):
+                try:
+                    found.append((pid, stat[1], parse_stream_marker(item[len(stream_prefix):].decode())))
+                except ValueError:
+                    pass
+    return found
+
+
+def _signal_group(pid, sig):
+    """Signal ffmpeg and everything it spawned; it leads its own session"""
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _kill_if_alive(pid):
+    if _process_alive(pid):
+        _signal_group(pid, signal.SIGKILL)
+
+
+class _FfmpegProtocol(asyncio.SubprocessProtocol):
+    """Feeds one ffmpeg's stdout and stderr to its handle as data arrives.
+
+    Plain callbacks rather than StreamReader coroutines: a -progress block
+    costs one call on the loop, with no future or task per read.
+    """
+
+    def __init__(self, engine, handle):
+        self.engine = engine
+        self.handle = handle
+        self.done = engine._loop.create_future()
+        self.transport = None
+        self._partial = {1: b'', 2: b''}
+        self._values = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def pipe_data_received(self, fd, data):
+        *lines, partial = (self._partial[fd] + data).split(b'\n')
+        self._partial[fd] = partial if len(partial) <= PIPE_LINE_LIMIT else b''
+        on_line = self._progress_line if fd == 1 else self._log_line
+        for line in lines:
+            on_line(line)
+
+    def process_exited(self):
+        # Anything left in the group would keep running unmanaged, and keep
+        # the pipes open
+        _signal_group(self.transport.get_pid(), signal.SIGKILL)
+
+    def connection_lost(self, exc):
+        # The process has exited and both pipes are drained
+        if self._partial[2]:
+            self._log_line(self._partial[2])
+        self.done.set_result(None)
+
+    def _progress_line(self, line):
+        key, _, value = line.decode('ascii', 'replace').strip().partition('=')
+        if key != 'progress':
+            self._values[key] = value
+            return
+        # A block ends with progress=continue|end; a stalled output stops
+        # producing them
+        handle = self.handle
+        handle.last_progress_at = time.time()
+        sample = parse_progress(self._values, handle.last_progress_at)
+        handle.metrics.append(sample)
+        if not math.isnan(sample[-1]):
+            handle.position = sample[-1]
+        self._values = {}
+
+    def _log_line(self, line):
+        message = line.decode('utf-8', 'replace').rstrip()
+        if message:
+            timestamp = time.time()
+            self.handle.logs.append((timestamp, message))
+            if self.engine.on_log is not None:
+                self.engine.on_log(self.handle.stream_id, timestamp, message)
+
+
+def _install_child_watcher(loop):
+    """Wait for children with pidfds instead of a thread per child.
+
+    Python 3.11's default ThreadedChildWatcher blocks one thread in
+    waitpid() for every subprocess, which is the per-process thread the
+    event loop is meant to avoid. Newer Pythons pick pidfds on their own.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(os, 'pidfd_open'):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+
+
+class _AdoptedProcess:
+    """Stands in for the transport of an ffmpeg started by an earlier server.
+
+    Its pipes went away with that server, so there is no stdin for 'q', no
+    progress and no exit code: only the pid, watched through a pidfd, or
+    polled where pidfds are unavailable.
+    """
+
+    def __init__(self, pid, loop):
+        self.pid = pid
+        self.done = loop.create_future()
+        self._loop = loop
+        self._pidfd = None
+        try:
+            self._pidfd = os.pidfd_open(pid)
+        except (AttributeError, OSError):
+            loop.call_later(ADOPT_POLL_INTERVAL, self._poll)
+        else:
+            loop.add_reader(self._pidfd, self._exited)
+
+    def _poll(self):
+        if _process_alive(self.pid):
+            self._loop.call_later(ADOPT_POLL_INTERVAL, self._poll)
+        else:
+            self._exited()
+
+    def _exited(self):
+        if self.done.done():
+            return
+        if self._pidfd is not None:
+            self._loop.remove_reader(self._pidfd)
+        _signal_group(self.pid, signal.SIGKILL)
+        self.done.set_result(None)
+
+    def get_pid(self):
+        return self.pid
+
+    def get_pipe_transport(self, fd):
+        return None
+
+    def get_returncode(self):
+        return None
+
+    def close(self):
+        if self._pidfd is not None:
+            os.close(self._pidfd)
+            self._pidfd = None
+
+
+class Timer:
+    """A callback scheduled on the engine's loop; cancel() works from any thread"""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class StreamingEngine:
+    """Process-wide registry of ffmpeg outputs, one per stream row.
+
+    The registry lives on this object, not in st.session_state, so every
+    session sees the same running streams. All process control runs on one
+    asyncio event loop in a background thread instead of two threads per
+    ffmpeg. The loop parses each process's -progress output on stdout into
+    a per-stream MetricsRing, drains stderr (an undrained pipe would stall
+    ffmpeg) and reports the exit through on_exit(handle, returncode).
+
+    The public methods are synchronous and safe to call from any thread
+    except the loop's own; they hand the work to the loop and wait for it.
+    Callbacks that may block (on_exit, call_later, every) run in a small
+    thread pool so a slow database write never holds up the loop.
+
+    stop() asks ffmpeg to quit with 'q' on stdin, so it finishes the
+    output cleanly, then escalates to SIGTERM and SIGKILL for the whole
+    process group after quit_timeout and term_timeout seconds. Whatever
+    ffmpeg leaves in its group when it exits is killed as well.
+
+    Every ffmpeg carries INSTANCE_ENV and STREAM_ENV in its environment.
+    After a server restart find_orphans() locates the survivors and
+    adopt() puts them back under this engine without their pipes.
+
+    stderr lines land in a fixed-size ring per stream and are handed to
+    on_log(stream_id, timestamp, message), which runs on the loop and must
+    not block. The log and metrics rings outlive restarts of the same
+    stream and are dropped by stop().
+    """
+
+    def __init__(self, ffmpeg_path=FFMPEG_PATH, on_exit=None, on_log=None, callback_workers=CALLBACK_WORKERS,
+                 quit_timeout=STOP_QUIT_TIMEOUT, term_timeout=STOP_TERM_TIMEOUT, instance=''):
+        self.ffmpeg_path = ffmpeg_path
+        self.instance = instance
+        self.on_exit = on_exit
+        self.on_log = on_log
+        self.quit_timeout = quit_timeout
+        self.term_timeout = term_timeout
+        self._processes = {}
+        # Keys whose ffmpeg is being spawned and not registered yet
+        self._starting = set()
+        self._metrics = {}
+        self._logs = {}
+        self._lock = threading.Lock()
+        self._callbacks = ThreadPoolExecutor(callback_workers, thread_name_prefix='stream-callback')
+        self._loop = asyncio.new_event_loop()
+        _install_child_watcher(self._loop)
+        self._thread = threading.Thread(target=self._loop.run_forever, name='stream-control', daemon=True)
+        self._thread.start()
+
+    def _call(self, coroutine, timeout=None):
+        """Run a coroutine on the loop and wait for its result"""
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("Engine methods cannot be called from its event loop")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    def start(self, stream_id, input_path, output_url, **options):
+        if not os.path.isfile(input_path):
+            raise StreamError(f"File video tidak ditemukan: {input_path}")
+        args = [self.ffmpeg_path] + build_ffmpeg_args(input_path, output_url, **options)
+        return self._call(self._start(stream_id, args, options.get('start_at')))
+
+    async def _start(self, stream_id, args, start_at):
+        # Reserved before the first await, so a second start of the same key
+        # cannot slip in while this one is spawning
+        with self._lock:
+            if stream_id in self._processes or stream_id in self._starting:
+                raise StreamError("Stream sudah berjalan")
+            self._starting.add(stream_id)
+            handle = StreamProcess(
+                stream_id, None, args, start_at,
+                self._metrics.setdefault(stream_id, MetricsRing()),
+                self._logs.setdefault(stream_id, deque(maxlen=MAX_LOG_LINES)),
+            )
+        try:
+            handle.process, protocol = await self._loop.subprocess_exec(
+                lambda: _FfmpegProtocol(self, handle),
+                *args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True,
+                env={**os.environ, INSTANCE_ENV: self.instance, STREAM_ENV: stream_marker(stream_id)},
+            )
+        except OSError as e:
+            raise StreamError(f"Gagal menjalankan ffmpeg: {e}") from e
+        finally:
+            with self._lock:
+                self._starting.discard(stream_id)
+        with self._lock:
+            self._processes[stream_id] = handle
+        handle.task = self._loop.create_task(self._run(handle, protocol.done), name=f"ffmpeg-{stream_id}")
+        return handle
+
+    def adopt(self, stream_id, pid):
+        """Take over an ffmpeg found by find_orphans()"""
+        return self._call(self._adopt(stream_id, pid))
+
+    async def _adopt(self, stream_id, pid):
+        with self._lock:
+            if stream_id in self._processes or stream_id in self._starting:
+                raise StreamError("Stream sudah berjalan")
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                args = [arg.decode('utf-8', 'replace') for arg in f.read().split(b'\0') if arg]
+        except OSError:
+            args = []
+        process = _AdoptedProcess(pid, self._loop)
+        with self._lock:
+            handle = StreamProcess(
+                stream_id, process, args, None,
+                self._metrics.setdefault(stream_id, MetricsRing()),
+                self._logs.setdefault(stream_id, deque(maxlen=MAX_LOG_LINES)),
+            )
+            handle.adopted = True
+            self._processes[stream_id] = handle
+        handle.task = self._loop.create_task(self._run(handle, process.done), name=f"ffmpeg-{stream_id}")
+        return handle
+
+    def terminate_orphan(self, pid):
+        """End an ffmpeg found by find_orphans() that nothing should be running"""
+        _signal_group(pid, signal.SIGTERM)
+        self._loop.call_soon_threadsafe(self._loop.call_later, self.term_timeout, _kill_if_alive, pid)
+
+    def stop(self, stream_id):
+        """Stop a stream's ffmpeg; returns False if it was not running"""
+        return self._call(self._stop(stream_id))
+
+    async def _stop(self, stream_id):
+        with self._lock:
+            handle = self._processes.get(stream_id)
+            self._metrics.pop(stream_id, None)
+            self._logs.pop(stream_id, None)
+        if handle is None:
+            return False
+        handle.stop_requested = True
+        stdin = handle.process.get_pipe_transport(0)
+        if stdin is not None and not stdin.is_closing():
+            stdin.write(b'q')
+            stdin.close()
+            if await self._exited(handle, self.quit_timeout):
+                return True
+        _signal_group(handle.pid, signal.SIGTERM)
+        if await self._exited(handle, self.term_timeout):
+            return True
+        logger.warning("ffmpeg of stream %s ignored SIGTERM, killing it", stream_id)
+        _signal_group(handle.pid, signal.SIGKILL)
+        await handle.task
+        return True
+
+    @staticmethod
+    async def _exited(handle, timeout):
+        try:
+            await asyncio.wait_for(asyncio.shield(handle.task), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def abort(self, stream_id):
+        """Kill a stream's ffmpeg so its owner can restart it"""
+        return self._call(self._abort(stream_id))
+
+    async def _abort(self, stream_id):
+        handle = self._processes.get(stream_id)
+        if handle is None:
+            return False
+        handle.aborted = True
+        _signal_group(handle.pid, signal.SIGKILL)
+        return True
+
+    def stop_all(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop every stream at once, killing whatever is left after timeout seconds"""
+        async def stop_all():
+            stops = asyncio.gather(*(self._stop(stream_id) for stream_id in self.active_streams()))
+            try:
+                await asyncio.wait_for(stops, timeout)
+            except asyncio.TimeoutError:
+                for handle in self.handles():
+                    _signal_group(handle.pid, signal.SIGKILL)
+        self._call(stop_all())
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) in the callback pool after delay seconds"""
+        timer = Timer()
+
+        def fire():
+            if not timer.cancelled:
+                self._callbacks.submit(self._guarded, callback, *args)
+        self._loop.call_soon_threadsafe(self._loop.call_later, delay, fire)
+        return timer
+
+    def every(self, interval, callback):
+        """Run callback() in the callback pool every interval seconds until cancelled"""
+        timer = Timer()
+
+        def fire():
+            if timer.cancelled:
+                return
+            self._callbacks.submit(self._guarded, callback)
+            self._loop.call_later(interval, fire)
+        self._loop.call_soon_threadsafe(self._loop.call_later, interval, fire)
+        return timer
+
+    @staticmethod
+    def _guarded(callback, *args):
+        try:
+            callback(*args)
+        except Exception:
+            logger.exception("Stream engine callback %r failed", callback)
+
+    def is_active(self, stream_id):
+        with self._lock:
+            return stream_id in self._processes
+
+    def active_streams(self):
+        with self._lock:
+            return list(self._processes)
+
+    def get(self, stream_id):
+        with self._lock:
+            return self._processes.get(stream_id)
+
+    def logs(self, stream_id):
+        with self._lock:
+            ring = self._logs.get(stream_id)
+        return list(ring) if ring is not None else []
+
+    def handles(self):
+        with self._lock:
+            return list(self._processes.values())
+
+    def metrics(self, stream_id):
+        """Progress time series of a stream, {field: [oldest..newest]}"""
+        with self._lock:
+            ring = self._metrics.get(stream_id)
+        return ring.snapshot() if ring is not None else None
+
+    async def _run(self, handle, done):
+        await done
+        returncode = handle.process.get_returncode()
+        handle.process.close()
+        with self._lock:
+            if self._processes.get(handle.stream_id) is handle:
+                del self._processes[handle.stream_id]
+        if self.on_exit is not None:
+            self._callbacks.submit(self._guarded, self.on_exit, handle, returncode)
+
+    def close(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop every stream and the loop; the engine cannot be used afterwards"""
+        self.stop_all(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._callbacks.shutdown(wait=False)
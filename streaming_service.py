@@ -0,0 +1,551 @@
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from capacity import SAMPLE_INTERVAL, CapacityError, CapacityPlanner, cost_class
+from media_probe import ProbeError, choose_mode, parse_resolution, probe_video, transcode_settings
+from records import Stream, StreamGroup, Video, parse_timestamp
+from renditions import rendition_media, rendition_profile
+from streaming_engine import (
+    SHUTDOWN_TIMEOUT, StreamError, StreamingEngine, find_orphans, resolve_endpoint, resolve_output_url,
+)
+from stream_logs import StreamLogWriter, log_time
+from supervisor import StreamSupervisor
+from video_storage import warm_file
+
+logger = logging.getLogger(__name__)
+
+PROBE_COLUMNS = ('video_codec', 'audio_codec', 'resolution', 'fps', 'bitrate', 'duration', 'keyframe_interval')
+
+
+# A pre-rolled start older than this is rebuilt from the database
+PREPARED_TTL = 300
+# Striped locks serializing starts of the same stream or group
+START_LOCK_STRIPES = 64
+
+
+@dataclass(slots=True)
+class PreparedStart:
+    """Everything start_stream needs, worked out during the pre-roll"""
+
+    input_path: str
+    output_url: str
+    options: dict
+    prepared_at: float
+
+
+def group_key(group_id):
+    """Engine registry key of a stream group's shared ffmpeg process"""
+    return ('group', group_id)
+
+
+class StreamingService:
+    """Runs stream rows on the StreamingEngine and keeps their status in the database.
+
+    This is the Python counterpart of services/streamingService.js: the
+    engine only knows about processes, this layer resolves the video file
+    and RTMP target from the database, records status transitions and
+    invalidates the owner's cached queries.
+
+    Every start goes through the CapacityPlanner first. A start by hand
+    that does not fit is refused with the reason; a scheduled one waits as
+    'queued' and is started in order once outputs stop or the measured
+    costs show room.
+    """
+
+    def __init__(self, storage, cache, engine=None, renditions=None):
+        self.storage = storage
+        self.renditions = renditions
+        self.cache = cache
+        self.engine = engine or StreamingEngine()
+        # Tags every ffmpeg with the database it belongs to, for reconcile()
+        self.engine.instance = os.path.abspath(storage.path)
+        self.engine.on_exit = self._on_exit
+        self.logs = StreamLogWriter(storage)
+        self.engine.on_log = self.logs.write
+        self.supervisor = StreamSupervisor(self.engine, self._set_key_status)
+        self.capacity = CapacityPlanner(storage, self.engine)
+        self._prepared = {}
+        self._start_locks = [threading.Lock() for _ in range(START_LOCK_STRIPES)]
+        # Scheduled streams waiting for capacity, oldest schedule first
+        self._queue = [row[0] for row in storage.fetchall(
+            "SELECT id FROM streams WHERE status = 'queued' ORDER BY scheduled_time, id"
+        )]
+        self._queue_lock = threading.Lock()
+        self._draining = threading.Lock()
+        self._capacity_timer = self.engine.every(SAMPLE_INTERVAL, self._capacity_tick)
+
+    def get_stream(self, stream_id, user_id=None):
+        stream = self.storage.fetchone(
+            "SELECT * FROM streams WHERE id = ?", (stream_id,), Stream.row_factory
+        )
+        if stream is None or (user_id is not None and stream.user_id != user_id):
+            raise StreamError("Stream tidak ditemukan")
+        return stream
+
+    def get_video(self, stream):
+        if stream.video_id is None:
+            raise StreamError("Pilih video untuk stream ini terlebih dahulu")
+        video = self.storage.fetchone(
+            "SELECT * FROM videos WHERE id = ?", (stream.video_id,), Video.row_factory
+        )
+        if video is None:
+            raise StreamError("Video untuk stream ini sudah dihapus")
+        return video
+
+    def get_group(self, group_id, user_id=None):
+        group = self.storage.fetchone(
+            "SELECT * FROM stream_groups WHERE id = ?", (group_id,), StreamGroup.row_factory
+        )
+        if group is None or (user_id is not None and group.user_id != user_id):
+            raise StreamError("Grup stream tidak ditemukan")
+        return group
+
+    def group_streams(self, group_id):
+        return self.storage.fetchall(
+            "SELECT * FROM streams WHERE group_id = ? ORDER BY id", (group_id,), Stream.row_factory
+        )
+
+    def is_live(self, key):
+        """Running, or supervised and waiting to be restarted"""
+        return self.engine.is_active(key) or self.supervisor.is_supervised(key)
+
+    def _start_lock(self, key):
+        """Held from the is_live check to the launch, so a key starts once"""
+        return self._start_locks[hash(key) % START_LOCK_STRIPES]
+
+    def _check_group_idle(self, stream):
+        if stream.group_id is not None and self.is_live(group_key(stream.group_id)):
+            raise StreamError("Stream ini sedang berjalan bersama grupnya; hentikan grupnya")
+
+    def prepare_stream(self, stream_id):
+        """Do the slow part of a start ahead of time.
+
+        Validates the video and reads its header into the page cache, probes
+        it and picks copy/rendition/transcode, and resolves the ingest host.
+        ffmpeg itself cannot be parked halfway: it opens the input and
+        connects the RTMP output in one go, so the process is still spawned
+        at start time.
+        """
+        stream = self.get_stream(stream_id)
+        video = self.get_video(stream)
+        output_url = resolve_output_url(stream.platform, stream.stream_key)
+        input_path, options = self.select_input([stream], video)
+        try:
+            warm_file(input_path)
+        except OSError as e:
+            raise StreamError(f"File video tidak dapat dibaca: {e}") from e
+        self._prepared[stream.id] = PreparedStart(input_path, output_url, options, time.monotonic())
+        # Reported, but the start still goes ahead: the lookup may recover
+        resolve_endpoint(output_url)
+
+    def discard_prepared(self, stream_id):
+        self._prepared.pop(stream_id, None)
+
+    def start_stream(self, stream_id, user_id=None, queue=False):
+        """Start a stream; with queue=True a start that does not fit waits instead.
+
+        Returns False when the stream was queued.
+        """
+        stream = self.get_stream(stream_id, user_id)
+        if self.is_live(stream.id):
+            raise StreamError("Stream sudah berjalan")
+        self._check_group_idle(stream)
+        prepared = self._prepared.pop(stream.id, None)
+        if prepared is not None and time.monotonic() - prepared.prepared_at < PREPARED_TTL:
+            input_path, output_url, options = prepared.input_path, prepared.output_url, prepared.options
+        else:
+            video = self.get_video(stream)
+            output_url = resolve_output_url(stream.platform, stream.stream_key)
+            input_path, options = self.select_input([stream], video)
+        # The slow part above runs unlocked; a concurrent start of the same
+        # stream (scheduler, queue, another tab) is refused here
+        with self._start_lock(stream.id):
+            if self.is_live(stream.id):
+                raise StreamError("Stream sudah berjalan")
+            try:
+                reserved = self.capacity.admit(stream.id, stream.user_id, cost_class(options))
+            except CapacityError as e:
+                if not queue:
+                    raise
+                self._enqueue(stream, e)
+                return False
+            # Mark active first so an immediate exit cannot be overwritten
+            self.set_status(stream.id, 'active')
+            try:
+                self.supervisor.launch(stream.id, input_path, output_url, loop=bool(stream.loop_video), **options)
+            except StreamError:
+                if reserved:
+                    self._release(stream.id)
+                self.set_status(stream.id, 'error', only_if='active')
+                raise
+        return True
+
+    def _enqueue(self, stream, reason):
+        if not self.set_status(stream.id, 'queued', only_if=('pending', 'queued')):
+            return
+        with self._queue_lock:
+            if stream.id not in self._queue:
+                self._queue.append(stream.id)
+        self.logs.write(stream.id, time.time(), f"Menunggu kapasitas: {reason}")
+        logger.info("Stream %s queued: %s", stream.id, reason)
+
+    def _start_queued(self):
+        """Start queued streams in order while capacity allows"""
+        # One pass at a time; a pass skipped here is covered by the next tick
+        if not self._draining.acquire(blocking=False):
+            return
+        try:
+            with self._queue_lock:
+                queued = list(self._queue)
+            full_users = set()
+            for stream_id in queued:
+                stream = self.storage.fetchone(
+                    "SELECT * FROM streams WHERE id = ?", (stream_id,), Stream.row_factory
+                )
+                if stream is None or stream.status != 'queued':
+                    self._dequeue(stream_id)
+                    continue
+                if stream.user_id in full_users:
+                    continue
+                try:
+                    self.start_stream(stream_id)
+                except CapacityError as e:
+                    if e.scope == 'host':
+                        # Nobody overtakes the head of the queue
+                        return
+                    full_users.add(stream.user_id)
+                    continue
+                except StreamError as e:
+                    logger.warning("Queued stream %s could not start: %s", stream_id, e)
+                    self.set_status(stream_id, 'error', only_if='queued')
+                    self._dequeue(stream_id)
+                    continue
+                self._dequeue(stream_id)
+                scheduled_time = parse_timestamp(stream.scheduled_time)
+                if scheduled_time is not None:
+                    self.record_start_latency(stream_id, int((datetime.now() - scheduled_time).total_seconds() * 1000))
+        finally:
+            self._draining.release()
+
+    def _dequeue(self, stream_id):
+        with self._queue_lock:
+            if stream_id in self._queue:
+                self._queue.remove(stream_id)
+
+    def _release(self, key):
+        """Give back an output's capacity and let the queue use it"""
+        self.capacity.release(key)
+        if self._queue:
+            self.engine.call_later(0, self._start_queued)
+
+    def _capacity_tick(self):
+        self.capacity.sample()
+        if self._queue:
+            self._start_queued()
+
+    def record_start_latency(self, stream_id, latency_ms):
+        """How long after its scheduled_time a stream's ffmpeg was running"""
+        with self.storage.writer() as conn:
+            row = conn.execute(
+                "UPDATE streams SET start_latency_ms = ? WHERE id = ? RETURNING user_id", (latency_ms, stream_id)
+            ).fetchone()
+        if row is not None:
+            self.cache.invalidate_user(row[0])
+
+    def start_group(self, group_id, user_id=None):
+        """Push the group's video to every member stream from one ffmpeg process.
+
+        The file is read and encoded once and the tee muxer fans it out, so
+        going live on N platforms costs one encode instead of N.
+        """
+        group = self.get_group(group_id, user_id)
+        key = group_key(group.id)
+        if self.is_live(key):
+            raise StreamError("Grup stream sudah berjalan")
+        streams = self.group_streams(group.id)
+        if not streams:
+            raise StreamError("Grup stream belum memiliki anggota")
+        if any(self.is_live(stream.id) for stream in streams):
+            raise StreamError("Hentikan stream anggota grup yang sedang berjalan terlebih dahulu")
+        if len({stream.video_id for stream in streams}) != 1:
+            raise StreamError("Semua stream dalam grup harus memakai video yang sama")
+        video = self.get_video(streams[0])
+        output_urls = [resolve_output_url(stream.platform, stream.stream_key) for stream in streams]
+        input_path, options = self.select_input(streams, video)
+        with self._start_lock(key):
+            if self.is_live(key):
+                raise StreamError("Grup stream sudah berjalan")
+            reserved = self.capacity.admit(key, group.user_id, cost_class(options))
+            self.set_group_status(group.id, 'active')
+            try:
+                self.supervisor.launch(
+                    key, input_path, output_urls,
+                    loop=any(stream.loop_video for stream in streams), **options
+                )
+            except StreamError:
+                if reserved:
+                    self._release(key)
+                self.set_group_status(group.id, 'error', only_if='active')
+                raise
+
+    def stop_group(self, group_id, user_id=None):
+        group = self.get_group(group_id, user_id)
+        self.stop_process(group_key(group.id))
+        self.set_group_status(group.id, 'stopped')
+
+    def stream_metrics(self, stream_id, group_id=None):
+        """Progress series of a stream, or of the group encode it is part of"""
+        if group_id is not None:
+            metrics = self.engine.metrics(group_key(group_id))
+            if metrics is not None:
+                return metrics
+        return self.engine.metrics(stream_id)
+
+    def stream_logs(self, stream_id, group_id=None, limit=200):
+        """ffmpeg output of a stream, or of the group encode it is part of.
+
+        While the output runs, the engine's ring holds its latest stderr
+        lines unthrottled; otherwise the persisted, rate-limited lines are
+        read back from stream_logs.
+        """
+        keys = (group_key(group_id), stream_id) if group_id is not None else (stream_id,)
+        for key in keys:
+            if self.engine.is_active(key):
+                lines = self.engine.logs(key)[-limit:]
+                if lines:
+                    return [(log_time(timestamp), message) for timestamp, message in lines]
+        return self.logs.recent(stream_id, group_id, limit)
+
+    def stop_process(self, key):
+        """End a stream's or group's ffmpeg and any pending restart"""
+        self.supervisor.cancel(key)
+        self.logs.forget(key)
+        stopped = self.engine.stop(key)
+        self._release(key)
+        return stopped
+
+    def select_input(self, streams, video):
+        """File to push and ffmpeg options for sending a video to some streams.
+
+        The original is copied when every platform accepts it; otherwise a
+        ready rendition made at upload is copied instead, and only when
+        neither fits is the video transcoded live.
+        """
+        options = self.output_options(streams, video)
+        if options['mode'] == 'copy' or self.renditions is None or not video.checksum:
+            return video.file_path, options
+        profiles = {rendition_profile(stream.platform) for stream in streams}
+        if len(profiles) == 1:
+            profile = profiles.pop()
+            path = self.renditions.ready_path(video.checksum, profile)
+            media = rendition_media(profile)
+            if path and all(choose_mode(media, stream.platform)[0] == 'copy' for stream in streams):
+                return path, {'mode': 'copy'}
+        return video.file_path, options
+
+    def output_options(self, streams, video):
+        """Stream copy when the source already fits every platform, else transcode.
+
+        A shared encode has to satisfy the strictest member, so the
+        transcode settings take the lowest bitrate and fps and the smallest
+        frame size of the members.
+        """
+        if isinstance(streams, Stream):
+            streams = [streams]
+        media = self.probe(video)
+        if media is None:
+            # Without ffprobe keep the old behaviour and push the file as is
+            return {'mode': 'copy'}
+        reasons = []
+        for stream in streams:
+            reasons += [f"{stream.platform}: {reason}" for reason in choose_mode(media, stream.platform)[1]]
+        if not reasons:
+            return {'mode': 'copy'}
+        logger.info("Source does not fit streams %s: %s", [stream.id for stream in streams], ', '.join(reasons))
+        settings = [
+            transcode_settings(stream.platform, stream.resolution, stream.bitrate, stream.fps)
+            for stream in streams
+        ]
+        return {
+            'mode': 'transcode',
+            'resolution': min((s['resolution'] for s in settings), key=lambda r: math.prod(parse_resolution(r))),
+            'bitrate': min(s['bitrate'] for s in settings),
+            'fps': min(s['fps'] for s in settings),
+        }
+
+    def probe(self, video):
+        """Probe results for a video, running ffprobe once per stored file.
+
+        Deduplicated uploads point at the same blob, so results are reused
+        from, and written to, every videos row sharing the checksum.
+        """
+        if video.video_codec is not None:
+            return {name: getattr(video, name) for name in PROBE_COLUMNS}
+        media = None
+        if video.checksum:
+            row = self.storage.fetchone(
+                f"SELECT {', '.join(PROBE_COLUMNS)} FROM videos WHERE checksum = ? AND video_codec IS NOT NULL LIMIT 1",
+                (video.checksum,)
+            )
+            media = dict(zip(PROBE_COLUMNS, row)) if row else None
+        if media is None:
+            try:
+                media = probe_video(video.file_path)
+            except ProbeError as e:
+                logger.warning("Could not probe video %s: %s", video.id, e)
+                return None
+        assignments = ', '.join(f"{name} = ?" for name in PROBE_COLUMNS)
+        params = [media[name] for name in PROBE_COLUMNS]
+        if video.checksum:
+            sql, params = f"UPDATE videos SET {assignments} WHERE checksum = ? RETURNING user_id", params + [video.checksum]
+        else:
+            sql, params = f"UPDATE videos SET {assignments} WHERE id = ? RETURNING user_id", params + [video.id]
+        with self.storage.writer() as conn:
+            user_ids = {row[0] for row in conn.execute(sql, params).fetchall()}
+        for user_id in user_ids:
+            self.cache.invalidate_user(user_id)
+        return media
+
+    def stop_stream(self, stream_id, user_id=None):
+        stream = self.get_stream(stream_id, user_id)
+        self._check_group_idle(stream)
+        self.stop_process(stream.id)
+        # Also covers rows left 'active' without a running process
+        self.set_status(stream.id, 'stopped')
+
+    def set_status(self, stream_id, status, only_if=None):
+        """Write a status transition, stamping start_time/end_time"""
+        return self._write_status("id = ?", stream_id, status, only_if)
+
+    def set_group_status(self, group_id, status, only_if=None):
+        """The same transition for every member of a stream group"""
+        return self._write_status("group_id = ?", group_id, status, only_if)
+
+    def _set_key_status(self, key, status, only_if=None):
+        """set_status for an engine key: a stream id or a group_key()"""
+        if status in ('stopped', 'error'):
+            self._release(key)
+        if isinstance(key, tuple):
+            return self.set_group_status(key[1], status, only_if)
+        return self.set_status(key, status, only_if)
+
+    def _write_status(self, where, key, status, only_if):
+        # A reconnect keeps the broadcast's original start_time
+        sql = (
+            "UPDATE streams SET status = ?, "
+            "start_time = CASE WHEN ? = 'active' AND status != 'reconnecting' THEN CURRENT_TIMESTAMP ELSE start_time END, "
+            "end_time = CASE WHEN ? IN ('active', 'reconnecting', 'queued') THEN NULL ELSE CURRENT_TIMESTAMP END "
+            f"WHERE {where}"
+        )
+        params = [status, status, status, key]
+        if only_if is not None:
+            only_if = (only_if,) if isinstance(only_if, str) else tuple(only_if)
+            sql += f" AND status IN ({', '.join('?' * len(only_if))})"
+            params += only_if
+        with self.storage.writer() as conn:
+            user_ids = {row[0] for row in conn.execute(sql + " RETURNING user_id", params).fetchall()}
+        for user_id in user_ids:
+            self.cache.invalidate_user(user_id)
+        return bool(user_ids)
+
+    def _on_exit(self, handle, returncode):
+        if not handle.stop_requested:
+            self.logs.write(handle.stream_id, time.time(), f"ffmpeg berhenti dengan kode {returncode}")
+        if self.supervisor.handle_exit(handle, returncode):
+            self.logs.write(handle.stream_id, time.time(), "Menyambung ulang...")
+            self._set_key_status(handle.stream_id, 'reconnecting', only_if='active')
+            return
+        # An adopted process has no exit code; it ended on its own
+        status = 'stopped' if handle.stop_requested or returncode in (0, None) else 'error'
+        self._set_key_status(handle.stream_id, status, only_if='active')
+
+    def reconcile(self):
+        """Make the database and the running encoders agree after a server restart.
+
+        Encoders tagged with this database that outlived the previous server
+        are adopted when their stream or group is still meant to be live,
+        and terminated otherwise (stopped or deleted rows, duplicates).
+        Rows left 'active' or 'reconnecting' without an encoder become
+        'error'. The status corrections are written in one transaction.
+        """
+        rows = {stream.id: stream for stream in self.storage.fetchall(
+            "SELECT * FROM streams WHERE status IN ('active', 'reconnecting')", (), Stream.row_factory
+        )}
+        running = set()
+        for pid, ppid, key in find_orphans(self.engine.instance):
+            if ppid == os.getpid():
+                # Still a child of this process, owned by an earlier engine here
+                running.add(key)
+                continue
+            if isinstance(key, tuple):
+                members = [stream for stream in rows.values() if stream.group_id == key[1]]
+            else:
+                members = [rows[key]] if key in rows else []
+            if not members or key in running:
+                logger.warning("Terminating unmanaged ffmpeg %s of stream %s", pid, key)
+                self.engine.terminate_orphan(pid)
+                continue
+            try:
+                self._adopt(key, pid, members)
+            except StreamError as e:
+                logger.warning("Could not adopt ffmpeg %s of stream %s: %s", pid, key, e)
+                self.engine.terminate_orphan(pid)
+                continue
+            logger.info("Adopted ffmpeg %s of stream %s", pid, key)
+            running.add(key)
+        adopted = [
+            stream.id for stream in rows.values()
+            if stream.id in running or (stream.group_id is not None and group_key(stream.group_id) in running)
+        ]
+        lost = [stream_id for stream_id in rows if stream_id not in adopted]
+        user_ids = set()
+        with self.storage.writer() as conn:
+            if adopted:
+                user_ids.update(row[0] for row in conn.execute(
+                    f"UPDATE streams SET status = 'active', end_time = NULL "
+                    f"WHERE status = 'reconnecting' AND id IN ({', '.join('?' * len(adopted))}) RETURNING user_id",
+                    adopted
+                ).fetchall())
+            if lost:
+                user_ids.update(row[0] for row in conn.execute(
+                    f"UPDATE streams SET status = 'error', end_time = CURRENT_TIMESTAMP "
+                    f"WHERE status IN ('active', 'reconnecting') AND id IN ({', '.join('?' * len(lost))}) RETURNING user_id",
+                    lost
+                ).fetchall())
+        for user_id in user_ids:
+            self.cache.invalidate_user(user_id)
+        for stream_id in lost:
+            self.logs.write(stream_id, time.time(), "Server dimulai ulang dan ffmpeg stream ini tidak lagi berjalan")
+        return {'adopted': len(adopted), 'lost': len(lost)}
+
+    def _adopt(self, key, pid, streams):
+        # The launch spec is only used if the adopted process dies
+        video = self.get_video(streams[0])
+        output_urls = [resolve_output_url(stream.platform, stream.stream_key) for stream in streams]
+        input_path, options = self.select_input(streams, video)
+        # Reserved first: an exit right after adopting releases it again
+        self.capacity.reserve(key, streams[0].user_id, cost_class(options))
+        try:
+            self.supervisor.adopt(
+                key, pid, input_path, output_urls if isinstance(key, tuple) else output_urls[0],
+                loop=any(stream.loop_video for stream in streams), **options
+            )
+        except StreamError:
+            self.capacity.release(key)
+            raise
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop every output within about timeout seconds, for server shutdown"""
+        self._capacity_timer.cancel()
+        keys = set(self.supervisor.shutdown()) | set(self.engine.active_streams())
+        self.engine.stop_all(timeout)
+        # on_exit writes these as well, but from threads the exiting
+        # interpreter does not wait for
+        for key in keys:
+            self._set_key_status(key, 'stopped', only_if=('active', 'reconnecting'))
+        self.logs.shutdown()
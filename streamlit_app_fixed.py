@@ -5,6 +5,9 @@ import hashlib
 from datetime import datetime
 import os
 
+from records import Stream, User, Video
+from session_store import SessionStore
+
 # Set page config
 st.set_page_config(
     page_title="StreamFlow - Live Streaming Platform",
@@ -21,25 +24,20 @@ def init_session():
         st.session_state.page = 'login'
     if 'db_initialized' not in st.session_state:
         st.session_state.db_initialized = False
-    if 'users' not in st.session_state:
-        st.session_state.users = []
-    if 'videos' not in st.session_state:
-        st.session_state.videos = []
-    if 'streams' not in st.session_state:
-        st.session_state.streams = []
+    if 'store' not in st.session_state:
+        st.session_state.store = SessionStore()
 
 # Initialize data storage (using session state for cloud compatibility)
 def init_data():
     if not st.session_state.db_initialized:
         # Create demo admin user
-        admin_user = {
-            'id': 1,
-            'username': 'admin',
-            'email': 'admin@streamflow.com',
-            'password_hash': hashlib.sha256('admin123'.encode()).hexdigest(),
-            'created_at': datetime.now().isoformat()
-        }
-        st.session_state.users.append(admin_user)
+        admin_user = User(
+            username='admin',
+            email='admin@streamflow.com',
+            password_hash=hashlib.sha256('admin123'.encode()).hexdigest(),
+            created_at=datetime.now()
+        )
+        st.session_state.store.add_user(admin_user)
         st.session_state.db_initialized = True
 
 # Authentication functions
@@ -50,26 +48,19 @@ def verify_password(password, hash_password):
     return hash_password == hashlib.sha256(password.encode()).hexdigest()
 
 def create_user(username, email, password):
-    # Check if user already exists
-    for user in st.session_state.users:
-        if user['username'] == username or user['email'] == email:
-            return False
-    
-    # Create new user
-    new_user = {
-        'id': len(st.session_state.users) + 1,
-        'username': username,
-        'email': email,
-        'password_hash': hash_password(password),
-        'created_at': datetime.now().isoformat()
-    }
-    st.session_state.users.append(new_user)
-    return True
+    new_user = User(
+        username=username,
+        email=email,
+        password_hash=hash_password(password),
+        created_at=datetime.now()
+    )
+    # The store rejects duplicate usernames and emails
+    return st.session_state.store.add_user(new_user) is not None
 
 def authenticate_user(username, password):
-    for user in st.session_state.users:
-        if user['username'] == username and verify_password(password, user['password_hash']):
-            return {'id': user['id'], 'username': user['username'], 'email': user['email']}
+    user = st.session_state.store.find_user_by_username(username)
+    if user and verify_password(password, user.password_hash):
+        return {'id': user.id, 'username': user.username, 'email': user.email}
     return None
 
 # Login page
@@ -182,16 +173,19 @@ def dashboard_page():
     # Main content
     col1, col2, col3 = st.columns(3)
     
+    store = st.session_state.store
+    user_id = st.session_state.user['id']
+    
     with col1:
-        video_count = len([v for v in st.session_state.videos if v['user_id'] == st.session_state.user['id']])
+        video_count = store.count_user_videos(user_id)
         st.metric("Total Video", video_count, help="Jumlah video yang telah diupload")
     
     with col2:
-        active_streams = len([s for s in st.session_state.streams if s['user_id'] == st.session_state.user['id'] and s['status'] == 'active'])
+        active_streams = store.count_user_streams(user_id, 'active')
         st.metric("Stream Aktif", active_streams, help="Jumlah stream yang sedang berjalan")
     
     with col3:
-        total_streams = len([s for s in st.session_state.streams if s['user_id'] == st.session_state.user['id']])
+        total_streams = store.count_user_streams(user_id)
         st.metric("Total Stream", total_streams, help="Total stream yang pernah dibuat")
     
     st.markdown("---")
@@ -218,13 +212,12 @@ def dashboard_page():
     
     # Recent activity
     st.subheader("📋 Aktivitas Terbaru")
-    user_streams = [s for s in st.session_state.streams if s['user_id'] == st.session_state.user['id']]
+    recent_streams = store.recent_streams(user_id)
     
-    if user_streams:
-        recent_streams = sorted(user_streams, key=lambda x: x['created_at'], reverse=True)[:5]
+    if recent_streams:
         data = []
         for stream in recent_streams:
-            data.append([stream['title'], stream['platform'], stream['status'], stream['created_at']])
+            data.append([stream.title, stream.platform, stream.status, stream.created_at])
         
         df = pd.DataFrame(data, columns=['Judul', 'Platform', 'Status', 'Dibuat'])
         st.dataframe(df, use_container_width=True)
@@ -245,16 +238,15 @@ def gallery_page():
         
         # Simulate saving to database
         if st.button("Simpan Video", use_container_width=True):
-            new_video = {
-                'id': len(st.session_state.videos) + 1,
-                'user_id': st.session_state.user['id'],
-                'filename': uploaded_file.name,
-                'original_name': uploaded_file.name,
-                'file_path': f"uploads/{uploaded_file.name}",
-                'file_size': uploaded_file.size if hasattr(uploaded_file, 'size') else 1024000,
-                'created_at': datetime.now().isoformat()
-            }
-            st.session_state.videos.append(new_video)
+            new_video = Video(
+                user_id=st.session_state.user['id'],
+                filename=uploaded_file.name,
+                original_name=uploaded_file.name,
+                file_path=f"uploads/{uploaded_file.name}",
+                file_size=uploaded_file.size if hasattr(uploaded_file, 'size') else 1024000,
+                created_at=datetime.now()
+            )
+            st.session_state.store.add_video(new_video)
             st.success("Video berhasil disimpan!")
             st.rerun()
     
@@ -262,21 +254,21 @@ def gallery_page():
     
     # Display videos
     st.subheader("📚 Video Anda")
-    user_videos = [v for v in st.session_state.videos if v['user_id'] == st.session_state.user['id']]
+    user_videos = st.session_state.store.user_videos(st.session_state.user['id'])
     
     if user_videos:
         for video in user_videos:
-            with st.expander(f"🎥 {video['original_name']}"):
+            with st.expander(f"🎥 {video.original_name}"):
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    st.write(f"**Nama File:** {video['filename']}")
-                    st.write(f"**Ukuran:** {video['file_size']} bytes")
+                    st.write(f"**Nama File:** {video.filename}")
+                    st.write(f"**Ukuran:** {video.file_size} bytes")
                 
                 with col2:
-                    st.write(f"**Upload:** {video['created_at']}")
-                    if st.button(f"Hapus", key=f"delete_{video['id']}"):
-                        st.session_state.videos = [v for v in st.session_state.videos if v['id'] != video['id']]
+                    st.write(f"**Upload:** {video.created_at}")
+                    if st.button(f"Hapus", key=f"delete_{video.id}"):
+                        st.session_state.store.delete_video(video.id)
                         st.success("Video dihapus!")
                         st.rerun()
     else:
@@ -298,9 +290,12 @@ def streams_page():
         
         with col2:
             stream_key = st.text_input("Stream Key", type="password", placeholder="Masukkan RTMP stream key")
-            user_videos = [v for v in st.session_state.videos if v['user_id'] == st.session_state.user['id']]
-            video_options = ["Tidak ada video"] + [v['original_name'] for v in user_videos]
-            selected_video = st.selectbox("Pilih Video", video_options)
+            store = st.session_state.store
+            video_options = [None] + [v.id for v in store.user_videos(st.session_state.user['id'])]
+            selected_video = st.selectbox(
+                "Pilih Video", video_options,
+                format_func=lambda video_id: store.videos[video_id].original_name if video_id else "Tidak ada video"
+            )
         
         scheduled_time = st.datetime_input("Jadwal Stream (Opsional)", value=None)
         
@@ -308,22 +303,17 @@ def streams_page():
         
         if submit_button:
             if title and platform and stream_key:
-                video_id = None
-                if selected_video != "Tidak ada video":
-                    video_id = next((v['id'] for v in user_videos if v['original_name'] == selected_video), None)
-                
-                new_stream = {
-                    'id': len(st.session_state.streams) + 1,
-                    'user_id': st.session_state.user['id'],
-                    'title': title,
-                    'platform': platform,
-                    'stream_key': stream_key,
-                    'video_id': video_id,
-                    'status': 'pending',
-                    'scheduled_time': scheduled_time.isoformat() if scheduled_time else None,
-                    'created_at': datetime.now().isoformat()
-                }
-                st.session_state.streams.append(new_stream)
+                new_stream = Stream(
+                    user_id=st.session_state.user['id'],
+                    title=title,
+                    platform=platform,
+                    stream_key=stream_key,
+                    video_id=selected_video,
+                    status='pending',
+                    scheduled_time=scheduled_time,
+                    created_at=datetime.now()
+                )
+                store.add_stream(new_stream)
                 st.success("Stream berhasil dibuat!")
                 st.rerun()
             else:
@@ -345,45 +335,41 @@ def streams_page():
     
     # Display streams
     st.subheader("📋 Stream Anda")
-    user_streams = [s for s in st.session_state.streams if s['user_id'] == st.session_state.user['id']]
+    user_streams = st.session_state.store.user_streams(st.session_state.user['id'])
     
     if user_streams:
         for stream in user_streams:
-            with st.expander(f"📺 {stream['title']} - {stream['platform']} ({stream['status']})"):
+            with st.expander(f"📺 {stream.title} - {stream.platform} ({stream.status})"):
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    st.write(f"**Judul:** {stream['title']}")
-                    st.write(f"**Platform:** {stream['platform']}")
-                    st.write(f"**Status:** {stream['status']}")
+                    st.write(f"**Judul:** {stream.title}")
+                    st.write(f"**Platform:** {stream.platform}")
+                    st.write(f"**Status:** {stream.status}")
                 
                 with col2:
-                    if stream['scheduled_time']:
-                        st.write(f"**Jadwal:** {stream['scheduled_time']}")
-                    st.write(f"**Dibuat:** {stream['created_at']}")
+                    if stream.scheduled_time:
+                        st.write(f"**Jadwal:** {stream.scheduled_time}")
+                    st.write(f"**Dibuat:** {stream.created_at}")
                 
                 # Action buttons
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
-                    if st.button(f"▶️ Mulai", key=f"start_{stream['id']}"):
-                        for i, s in enumerate(st.session_state.streams):
-                            if s['id'] == stream['id']:
-                                st.session_state.streams[i]['status'] = 'active'
+                    if st.button(f"▶️ Mulai", key=f"start_{stream.id}"):
+                        st.session_state.store.set_stream_status(stream.id, 'active')
                         st.success("Stream dimulai!")
                         st.rerun()
                 
                 with col2:
-                    if st.button(f"⏹️ Berhenti", key=f"stop_{stream['id']}"):
-                        for i, s in enumerate(st.session_state.streams):
-                            if s['id'] == stream['id']:
-                                st.session_state.streams[i]['status'] = 'stopped'
+                    if st.button(f"⏹️ Berhenti", key=f"stop_{stream.id}"):
+                        st.session_state.store.set_stream_status(stream.id, 'stopped')
                         st.success("Stream dihentikan!")
                         st.rerun()
                 
                 with col3:
-                    if st.button(f"🗑️ Hapus", key=f"delete_stream_{stream['id']}"):
-                        st.session_state.streams = [s for s in st.session_state.streams if s['id'] != stream['id']]
+                    if st.button(f"🗑️ Hapus", key=f"delete_stream_{stream.id}"):
+                        st.session_state.store.delete_stream(stream.id)
                         st.success("Stream dihapus!")
                         st.rerun()
     else:
@@ -420,12 +406,10 @@ def settings_page():
                 if new_password == confirm_password:
                     if len(new_password) >= 8:
                         # Find user and verify current password
-                        user_data = next((u for u in st.session_state.users if u['id'] == user['id']), None)
-                        if user_data and verify_password(current_password, user_data['password_hash']):
+                        user_data = st.session_state.store.get_user(user['id'])
+                        if user_data and verify_password(current_password, user_data.password_hash):
                             # Update password
-                            for i, u in enumerate(st.session_state.users):
-                                if u['id'] == user['id']:
-                                    st.session_state.users[i]['password_hash'] = hash_password(new_password)
+                            user_data.password_hash = hash_password(new_password)
                             st.success("Password berhasil diubah!")
                         else:
                             st.error("Password saat ini salah")
@@ -6,6 +6,8 @@ from datetime import datetime
 import hashlib
 import uuid
 
+from migrations import migrate
+
 # Set page config
 st.set_page_config(
     page_title="StreamFlow - Live Streaming Platform",
@@ -20,61 +22,15 @@ def init_database():
     # Use in-memory database for cloud deployment
     if 'db_connection' not in st.session_state:
         try:
-            st.session_state.db_connection = sqlite3.connect(':memory:', check_same_thread=False)
+            conn = sqlite3.connect(':memory:', check_same_thread=False)
+            # Schema is applied once per connection, not on every rerun
+            migrate(conn)
         except Exception as e:
             st.error(f"Database connection error: {e}")
             return None
+        st.session_state.db_connection = conn
     
-    conn = st.session_state.db_connection
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            avatar_path TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create videos table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            filename TEXT NOT NULL,
-            original_name TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            thumbnail_path TEXT,
-            duration INTEGER,
-            file_size INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Create streams table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS streams (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            platform TEXT NOT NULL,
-            stream_key TEXT NOT NULL,
-            video_id INTEGER,
-            status TEXT DEFAULT 'pending',
-            scheduled_time TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (video_id) REFERENCES videos (id)
-        )
-    ''')
-    
-    conn.commit()
-    return conn
+    return st.session_state.db_connection
 
 # Initialize database
 if init_database() is None:
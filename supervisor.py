@@ -0,0 +1,192 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from streaming_engine import StreamError
+
+logger = logging.getLogger(__name__)
+
+# Restarts after an unexpected exit before a stream is marked 'error'
+MAX_RESTARTS = int(os.environ.get('STREAMFLOW_MAX_RESTARTS', '5'))
+RESTART_BASE_DELAY = 2.0
+RESTART_MAX_DELAY = 60.0
+# A run that lasted this long resets the restart count
+STABLE_SECONDS = 60.0
+# No -progress report for this long means the output is stuck
+STALL_SECONDS = float(os.environ.get('STREAMFLOW_STALL_SECONDS', '30'))
+WATCHDOG_INTERVAL = 5.0
+
+
+class LaunchSpec:
+    """How a stream was started, kept to start it again"""
+
+    def __init__(self, input_path, output_url, options):
+        self.input_path = input_path
+        self.output_url = output_url
+        self.options = options
+        self.restarts = 0
+        self.timer = None
+
+
+class StreamSupervisor:
+    """Keeps streams live across ffmpeg crashes and stalled outputs.
+
+    Replaces the fixed MAX_RETRY_ATTEMPTS loop of streamingService.js. An
+    unexpected exit is restarted after an exponential backoff with random
+    jitter, so many streams dropped by the same network blip do not
+    reconnect in lockstep. Non-looping streams resume from the last media
+    position ffmpeg reported. A watchdog kills outputs whose progress
+    reports stop, which turns a stall into an ordinary restart. Backoff
+    timers and the watchdog are scheduled on the engine's event loop, so
+    supervising many streams adds no threads.
+
+    set_status(key, status, only_if) writes the transitions: 'reconnecting'
+    while waiting, 'active' again after a restart, 'error' when it gives up.
+    """
+
+    def __init__(self, engine, set_status):
+        self.engine = engine
+        self.set_status = set_status
+        self._specs = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._watchdog_timer = engine.every(WATCHDOG_INTERVAL, self._watchdog)
+
+    def launch(self, key, input_path, output_url, **options):
+        """Start a stream on the engine and supervise it from now on.
+
+        A key that is still supervised, running or waiting to restart, is
+        refused and left alone; cancel() it first.
+        """
+        spec = LaunchSpec(input_path, output_url, options)
+        # Registered first: an immediate exit must already be supervised
+        with self._lock:
+            if key in self._specs:
+                raise StreamError("Stream sudah berjalan")
+            self._specs[key] = spec
+        try:
+            return self.engine.start(key, input_path, output_url, **options)
+        except StreamError:
+            with self._lock:
+                if self._specs.get(key) is spec:
+                    del self._specs[key]
+            raise
+
+    def adopt(self, key, pid, input_path, output_url, **options):
+        """Supervise an ffmpeg left running by an earlier server; crashes restart it fresh"""
+        spec = LaunchSpec(input_path, output_url, options)
+        with self._lock:
+            self._cancel_locked(key)
+            self._specs[key] = spec
+        try:
+            return self.engine.adopt(key, pid)
+        except StreamError:
+            with self._lock:
+                if self._specs.get(key) is spec:
+                    del self._specs[key]
+            raise
+
+    def cancel(self, key):
+        """Stop supervising; a pending restart is dropped"""
+        with self._lock:
+            self._cancel_locked(key)
+
+    def _cancel_locked(self, key):
+        spec = self._specs.pop(key, None)
+        if spec is not None and spec.timer is not None:
+            spec.timer.cancel()
+
+    def is_supervised(self, key):
+        """Running under supervision, or waiting to be restarted"""
+        with self._lock:
+            return key in self._specs
+
+    def handle_exit(self, handle, returncode):
+        """Decide what an exit means; returns True if a restart is pending"""
+        key = handle.stream_id
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is None or handle.stop_requested or self._stopping.is_set():
+                self._specs.pop(key, None)
+                return False
+            loop = spec.options.get('loop', True)
+            if returncode == 0 and not loop and not handle.aborted:
+                # A non-looping video reached its end
+                del self._specs[key]
+                return False
+            if returncode is None and handle.adopted and not loop:
+                # No exit code and no position for an adopted process: a
+                # crash cannot be told from the end of the video, and a
+                # restart would play it again from the start
+                del self._specs[key]
+                return False
+            if time.time() - handle.started_at >= STABLE_SECONDS:
+                spec.restarts = 0
+            if spec.restarts >= MAX_RESTARTS:
+                del self._specs[key]
+                logger.warning("Stream %s gave up after %d restarts", key, spec.restarts)
+                return False
+            if not loop:
+                spec.options['start_at'] = handle.start_at + handle.position
+            delay = min(RESTART_MAX_DELAY, RESTART_BASE_DELAY * 2 ** spec.restarts)
+            delay = random.uniform(delay / 2, delay)
+            spec.restarts += 1
+            spec.timer = self.engine.call_later(delay, self._restart, key, spec)
+        logger.info("Stream %s exited with %s, restart %d in %.1f s", key, returncode, spec.restarts, delay)
+        return True
+
+    def _restart(self, key, spec):
+        with self._lock:
+            if self._specs.get(key) is not spec:
+                return
+            spec.timer = None
+        # Active first, as in StreamingService.start_stream, so an immediate
+        # exit of the new process is not overwritten; a stop during the
+        # backoff left another status and ends supervision here
+        if not self.set_status(key, 'active', ('reconnecting',)):
+            self.cancel(key)
+            return
+        try:
+            self.engine.start(key, spec.input_path, spec.output_url, **spec.options)
+        except StreamError as e:
+            logger.warning("Restart of stream %s failed: %s", key, e)
+            # Counts as another failed run
+            if self.handle_exit(_FailedStart(key, spec.options.get('start_at')), None):
+                self.set_status(key, 'reconnecting', ('active',))
+            else:
+                self.set_status(key, 'error', ('active',))
+
+    def _watchdog(self):
+        now = time.time()
+        for handle in self.engine.handles():
+            # Adopted processes have no progress pipe to watch
+            if handle.stop_requested or handle.aborted or handle.adopted:
+                continue
+            if now - handle.last_progress_at > STALL_SECONDS:
+                logger.warning("Stream %s stalled, restarting", handle.stream_id)
+                self.engine.abort(handle.stream_id)
+
+    def shutdown(self):
+        """Stop restarting anything; returns the keys that were supervised"""
+        self._stopping.set()
+        self._watchdog_timer.cancel()
+        with self._lock:
+            keys = list(self._specs)
+            for key in keys:
+                self._cancel_locked(key)
+        return keys
+
+
+class _FailedStart:
+    """Stands in for the handle of a restart that never got a process"""
+
+    def __init__(self, stream_id, start_at):
+        self.stream_id = stream_id
+        self.stop_requested = False
+        self.aborted = True
+        self.adopted = False
+        self.started_at = time.time()
+        self.start_at = start_at or 0.0
+        self.position = 0.0
@@ -0,0 +1,77 @@
+import threading
+from array import array
+
+# Samples kept per stream; ffmpeg reports about twice a second, so this
+# is roughly the last five minutes
+METRICS_CAPACITY = 600
+METRIC_FIELDS = ('time', 'fps', 'bitrate_kbps', 'speed', 'drop_frames', 'dup_frames', 'out_time')
+
+
+def _number(value, suffix=''):
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+
+def parse_progress(values, timestamp):
+    """One metrics sample from a block of ffmpeg -progress key=value pairs"""
+    out_time_us = values.get('out_time_us', '')
+    return (
+        timestamp,
+        _number(values.get('fps', '')),
+        _number(values.get('bitrate', ''), 'kbits/s'),
+        _number(values.get('speed', ''), 'x'),
+        _number(values.get('drop_frames', '')),
+        _number(values.get('dup_frames', '')),
+        int(out_time_us) / 1_000_000 if out_time_us.isdigit() else float('nan'),
+    )
+
+
+class MetricsRing:
+    """Fixed-size time series of progress samples for one stream.
+
+    Each field is a preallocated array of doubles written in place at a
+    wrapping index, so a stream that runs for days uses the same memory as
+    one that just started. Missing values (ffmpeg's N/A) are stored as NaN.
+    """
+
+    def __init__(self, capacity=METRICS_CAPACITY):
+        self.capacity = capacity
+        self._columns = [array('d', bytes(8 * capacity)) for _ in METRIC_FIELDS]
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, sample):
+        with self._lock:
+            for column, value in zip(self._columns, sample):
+                column[self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def __len__(self):
+        return self._count
+
+    def latest(self):
+        """The newest sample as a dict, or None before the first report"""
+        with self._lock:
+            if not self._count:
+                return None
+            index = (self._next - 1) % self.capacity
+            return {name: column[index] for name, column in zip(METRIC_FIELDS, self._columns)}
+
+    def snapshot(self):
+        """{field: [values oldest to newest]} copied out of the ring"""
+        with self._lock:
+            start = (self._next - self._count) % self.capacity
+            result = {}
+            for name, column in zip(METRIC_FIELDS, self._columns):
+                if start + self._count <= self.capacity:
+                    result[name] = column[start:start + self._count].tolist()
+                else:
+                    result[name] = column[start:].tolist() + column[:self._next].tolist()
+            return result
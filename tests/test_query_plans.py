@@ -0,0 +1,134 @@
+"""EXPLAIN QUERY PLAN checks for the dashboard and listing queries.
+
+Every query behind the dashboard, the gallery and the stream lists must be
+answered from an index: a plan step that SCANs a table would grow with the
+whole table instead of with one user's page. The SQL of the Streamlit
+helpers is read straight from main_streamlit_app.py, so the test needs
+neither Streamlit nor a session and follows the queries as they change.
+
+Run with: python -m pytest
+"""
+import ast
+import os
+import re
+import tempfile
+import unittest
+
+from database import StorageEngine
+from jobs import JobQueue
+from migrations import migrate_storage
+from renditions import RenditionStore
+from stream_logs import StreamLogWriter
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main_streamlit_app.py')
+
+# Helpers in main_streamlit_app.py that run on every dashboard or list render
+LISTING_HELPERS = (
+    'get_dashboard_summary',
+    'get_start_latencies',
+    'get_recent_streams',
+    'find_video_by_checksum',
+    'get_user_videos_page',
+    'get_video_options',
+    'get_user_streams_page',
+    'get_ungrouped_stream_options',
+    'get_user_stream_groups',
+)
+# fetch_page() fills {where} with nothing on the first page and with the
+# keyset condition on the following ones
+PAGE_WHERE = ("", "AND (created_at, id) < (?, ?)")
+
+_TABLE_SCAN = re.compile(r'^SCAN (\w+)')
+
+
+def helper_queries(path=APP_PATH):
+    """{helper name: [SELECT statements]} for LISTING_HELPERS"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    queries = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.FunctionDef) or node.name not in LISTING_HELPERS:
+            continue
+        for child in ast.walk(node):
+            if isinstance(child, ast.Constant) and isinstance(child.value, str) \
+                    and child.value.lstrip().upper().startswith('SELECT'):
+                variants = [child.value.format(where=where) for where in PAGE_WHERE] \
+                    if '{where}' in child.value else [child.value]
+                queries.setdefault(node.name, []).extend(variants)
+    return queries
+
+
+class _RecordingStorage(StorageEngine):
+    """StorageEngine that remembers every read it is asked to run"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = []
+
+    def fetchone(self, sql, params=(), row_factory=None):
+        self.reads.append((sql, tuple(params)))
+        return super().fetchone(sql, params, row_factory)
+
+    def fetchall(self, sql, params=(), row_factory=None):
+        self.reads.append((sql, tuple(params)))
+        return super().fetchall(sql, params, row_factory)
+
+
+class QueryPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.storage = _RecordingStorage(os.path.join(self._tmp.name, 'plans.db'))
+        migrate_storage(self.storage)
+        self.tables = {
+            row[0] for row in self.storage.fetchall("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+
+    def tearDown(self):
+        self.storage.close()
+        self._tmp.cleanup()
+
+    def plan(self, sql, params=None):
+        if params is None:
+            params = (1,) * sql.count('?')
+        return [row[3] for row in self.storage.fetchall(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    def assertNoTableScan(self, sql, params=None):
+        plan = self.plan(sql, params)
+        scans = [
+            step for step in plan
+            if (match := _TABLE_SCAN.match(step)) and match.group(1) in self.tables
+        ]
+        self.assertFalse(scans, f"{sql}\nplans as:\n  " + "\n  ".join(plan))
+
+    def test_helpers_are_found(self):
+        queries = helper_queries()
+        self.assertEqual(sorted(queries), sorted(LISTING_HELPERS))
+
+    def test_streamlit_helpers_use_indexes(self):
+        for name, statements in helper_queries().items():
+            for sql in statements:
+                with self.subTest(helper=name, sql=sql):
+                    self.assertNoTableScan(sql)
+
+    def test_listing_services_use_indexes(self):
+        jobs = JobQueue(self.storage)
+        renditions = RenditionStore(self.storage, jobs)
+        logs = StreamLogWriter(self.storage)
+        self.storage.reads.clear()
+        try:
+            renditions.statuses(['a' * 64, 'b' * 64])
+            jobs.jobs_for_refs(['a' * 64, 'b' * 64])
+            logs.recent(1)
+            logs.recent(1, 2)
+        finally:
+            logs.shutdown()
+        reads = list(self.storage.reads)
+        self.assertGreaterEqual(len(reads), 4)
+        for sql, params in reads:
+            with self.subTest(sql=sql):
+                self.assertNoTableScan(sql, params)
+
+
+if __name__ == '__main__':
+    unittest.main()
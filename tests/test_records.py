@@ -0,0 +1,60 @@
+"""Record types read from a migrated database.
+
+Run with: python -m pytest
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from database import StorageEngine
+from migrations import migrate_storage
+from records import Job, Stream, StreamGroup, User, Video
+
+TABLES = {
+    User: 'users',
+    Video: 'videos',
+    Stream: 'streams',
+    Job: 'jobs',
+    StreamGroup: 'stream_groups',
+}
+
+
+class RecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.storage = StorageEngine(os.path.join(self._tmp.name, 'records.db'))
+        migrate_storage(self.storage)
+        with self.storage.writer() as conn:
+            conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('u', 'u@example.com', 'x')")
+            conn.execute(
+                "INSERT INTO videos (user_id, filename, original_name, file_path) VALUES (1, 'v.mp4', 'v.mp4', '/v.mp4')"
+            )
+            conn.execute("INSERT INTO stream_groups (user_id, title) VALUES (1, 'g')")
+            conn.execute(
+                "INSERT INTO streams (user_id, title, platform, stream_key, video_id, group_id, scheduled_time) "
+                "VALUES (1, 's', 'YouTube', 'key', 1, 1, '2026-01-01 12:00:00')"
+            )
+            conn.execute("INSERT INTO jobs (kind, payload, priority) VALUES ('rendition', '{}', 0)")
+
+    def tearDown(self):
+        self.storage.close()
+        self._tmp.cleanup()
+
+    def test_select_star_after_a_new_column(self):
+        for record, table in TABLES.items():
+            with self.subTest(table=table):
+                self.storage.execute(f"ALTER TABLE {table} ADD COLUMN added_later TEXT DEFAULT 'x'")
+                row = self.storage.fetchone(f"SELECT * FROM {table}", (), record.row_factory)
+                self.assertIsInstance(row, record)
+                self.assertEqual(row.id, 1)
+
+    def test_timestamps_are_parsed(self):
+        stream = self.storage.fetchone("SELECT * FROM streams", (), Stream.row_factory)
+        self.assertEqual(stream.scheduled_time, datetime(2026, 1, 1, 12, 0))
+        self.assertIsInstance(stream.created_at, datetime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""StreamScheduler timing against a temporary database and a stand-in service.
+
+Run with: python -m pytest
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import scheduler
+from database import StorageEngine
+from migrations import migrate_storage
+from records import format_timestamp
+
+
+class SlowPrerollService:
+    """Records when each stream was started; every pre-roll takes preroll_seconds"""
+
+    def __init__(self, preroll_seconds):
+        self.preroll_seconds = preroll_seconds
+        self.prepared = set()
+        self.started = {}
+        self._lock = threading.Lock()
+
+    def prepare_stream(self, stream_id):
+        time.sleep(self.preroll_seconds)
+        with self._lock:
+            self.prepared.add(stream_id)
+
+    def discard_prepared(self, stream_id):
+        with self._lock:
+            self.prepared.discard(stream_id)
+
+    def start_stream(self, stream_id, queue=False):
+        with self._lock:
+            self.started[stream_id] = datetime.now()
+        return True
+
+    def record_start_latency(self, stream_id, latency_ms):
+        pass
+
+    def set_status(self, stream_id, status, only_if=None):
+        pass
+
+
+class PrerollTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.storage = StorageEngine(os.path.join(self._tmp.name, 'scheduler.db'))
+        migrate_storage(self.storage)
+        self.storage.execute("INSERT INTO users (username, email, password_hash) VALUES ('u', 'u@example.com', 'x')")
+
+    def tearDown(self):
+        self.storage.close()
+        self._tmp.cleanup()
+
+    def run_scheduler(self, streams, service, preroll, wait_after=0.0):
+        """Schedule streams for one start time; returns it once they all started"""
+        scheduled_time = datetime.now().replace(microsecond=0) + timedelta(seconds=2)
+        for index in range(streams):
+            self.storage.execute(
+                "INSERT INTO streams (user_id, title, platform, stream_key, status, scheduled_time) "
+                "VALUES (1, ?, 'YouTube', 'key', 'pending', ?)",
+                (f"stream {index}", format_timestamp(scheduled_time))
+            )
+        with mock.patch.object(scheduler, 'PREROLL', preroll):
+            stream_scheduler = scheduler.StreamScheduler(self.storage, service).start()
+            try:
+                deadline = time.monotonic() + 10
+                while len(service.started) < streams and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                time.sleep(wait_after)
+            finally:
+                stream_scheduler.stop()
+        self.assertEqual(len(service.started), streams)
+        return scheduled_time
+
+    def test_slow_prerolls_do_not_delay_starts(self):
+        # Run inline, these pre-rolls would end 4 * 0.8 s after they began
+        service = SlowPrerollService(preroll_seconds=0.8)
+        scheduled_time = self.run_scheduler(4, service, timedelta(seconds=1.5))
+        for started_at in service.started.values():
+            self.assertLess((started_at - scheduled_time).total_seconds(), 0.5)
+
+    def test_preroll_finishing_after_its_start_is_dropped(self):
+        service = SlowPrerollService(preroll_seconds=1.5)
+        scheduled_time = self.run_scheduler(1, service, timedelta(seconds=0.5), wait_after=1.5)
+        for started_at in service.started.values():
+            self.assertLess((started_at - scheduled_time).total_seconds(), 0.5)
+        self.assertEqual(service.prepared, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+"""StreamingEngine against a fake ffmpeg, and the output URL helpers.
+
+The fake is the encoder of benchmarks/control_plane.py: a shell script that
+prints a -progress block every half second and exits on 'q' or a signal.
+
+Run with: python -m pytest
+"""
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import streaming_engine
+from benchmarks.control_plane import FAKE_ENCODER
+from streaming_engine import (
+    StreamError, StreamingEngine, build_ffmpeg_args, find_orphans, resolve_output_url, tee_target,
+)
+
+_QUIT_READER = '{ c=$(head -c 1 <&3); [ "$c" = q ] && kill $$; } >/dev/null 2>&1 &\n'
+# Ignores 'q' but dies on SIGTERM
+DEAF_ENCODER = FAKE_ENCODER.replace(_QUIT_READER, '', 1)
+# Ignores 'q' and SIGTERM; only SIGKILL ends it
+STUBBORN_ENCODER = FAKE_ENCODER.replace(_QUIT_READER, "trap '' TERM\n", 1)
+
+
+class EngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.ffmpeg = self.script('ffmpeg', FAKE_ENCODER)
+        self.input_path = os.path.join(self._tmp.name, 'input.mp4')
+        with open(self.input_path, 'wb') as f:
+            f.write(b'\0' * 1024)
+        # Unique per test, so find_orphans() only sees this test's processes
+        self.instance = self._tmp.name
+        self.engine = self.make_engine(self.ffmpeg)
+
+    def tearDown(self):
+        self.engine.close(timeout=5)
+        self._tmp.cleanup()
+
+    def script(self, name, body):
+        path = os.path.join(self._tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(body)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        return path
+
+    def make_engine(self, ffmpeg, **kwargs):
+        return StreamingEngine(ffmpeg, instance=self.instance, **kwargs)
+
+    def running_keys(self):
+        return sorted(key for _, _, key in find_orphans(self.instance))
+
+
+class ConcurrentStartTest(EngineTestCase):
+
+    def test_same_key_starts_once(self):
+        starters = 8
+        barrier = threading.Barrier(starters)
+        results = []
+
+        def start():
+            barrier.wait()
+            try:
+                results.append(self.engine.start(1, self.input_path, 'rtmp://127.0.0.1/live/1'))
+            except StreamError as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=start) for _ in range(starters)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        started = [result for result in results if not isinstance(result, StreamError)]
+        self.assertEqual(len(started), 1)
+        self.assertEqual(self.running_keys(), [1])
+        self.assertIs(self.engine.get(1), started[0])
+
+        self.engine.stop_all()
+        self.assertEqual(self.running_keys(), [])
+
+    def test_failed_spawn_releases_the_key(self):
+        engine = self.make_engine(os.path.join(self._tmp.name, 'missing-ffmpeg'))
+        try:
+            with self.assertRaises(StreamError):
+                engine.start(1, self.input_path, 'rtmp://127.0.0.1/live/1')
+            engine.ffmpeg_path = self.ffmpeg
+            engine.start(1, self.input_path, 'rtmp://127.0.0.1/live/1')
+            self.assertTrue(engine.is_active(1))
+        finally:
+            engine.close(timeout=5)
+
+
+class StopTest(EngineTestCase):
+    QUIT_TIMEOUT = 0.5
+    TERM_TIMEOUT = 0.5
+
+    def stop_with(self, encoder):
+        """Start one stream on encoder and stop it; returns the seconds stop() took"""
+        engine = self.make_engine(
+            self.script('encoder', encoder), quit_timeout=self.QUIT_TIMEOUT, term_timeout=self.TERM_TIMEOUT
+        )
+        try:
+            handle = engine.start(1, self.input_path, 'rtmp://127.0.0.1/live/1')
+            # Let the script reach its loop, with its traps and reader set up
+            deadline = time.monotonic() + 5
+            while engine.metrics(1)['speed'] == [] and time.monotonic() < deadline:
+                time.sleep(0.05)
+            started = time.monotonic()
+            self.assertTrue(engine.stop(1))
+            elapsed = time.monotonic() - started
+            self.assertFalse(engine.is_active(1))
+            self.assertTrue(handle.stop_requested)
+            self.assertEqual(self.running_keys(), [])
+            return elapsed
+        finally:
+            engine.close(timeout=5)
+
+    def test_quit_on_q(self):
+        self.assertLess(self.stop_with(FAKE_ENCODER), self.QUIT_TIMEOUT)
+
+    def test_sigterm_after_quit_timeout(self):
+        elapsed = self.stop_with(DEAF_ENCODER)
+        self.assertGreaterEqual(elapsed, self.QUIT_TIMEOUT)
+        self.assertLess(elapsed, self.QUIT_TIMEOUT + self.TERM_TIMEOUT)
+
+    def test_sigkill_after_term_timeout(self):
+        self.assertGreaterEqual(self.stop_with(STUBBORN_ENCODER), self.QUIT_TIMEOUT + self.TERM_TIMEOUT)
+
+    def test_stop_of_unknown_stream(self):
+        self.assertFalse(self.engine.stop(42))
+
+
+class FileSinkTest(EngineTestCase):
+
+    def test_file_sink_with_operator_flag(self):
+        sink = os.path.join(self._tmp.name, 'out.flv')
+        with mock.patch.object(streaming_engine, 'ALLOW_FILE_OUTPUT', True):
+            output_url = resolve_output_url('Custom RTMP', sink)
+        self.assertEqual(output_url, sink)
+        handle = self.engine.start(1, self.input_path, output_url)
+        self.assertEqual(handle.args[-3:], ['-f', 'flv', sink])
+        self.engine.stop(1)
+
+
+class OutputUrlTest(unittest.TestCase):
+
+    def test_rtmp_keys(self):
+        self.assertEqual(resolve_output_url('YouTube', 'abcd-1234'), 'rtmp://a.rtmp.youtube.com/live2/abcd-1234')
+        self.assertEqual(resolve_output_url('Custom RTMP', 'rtmp://ingest.example.com/live/k'),
+                         'rtmp://ingest.example.com/live/k')
+        self.assertEqual(resolve_output_url('Custom RTMP', 'RTMPS://ingest.example.com:443/live/k'),
+                         'RTMPS://ingest.example.com:443/live/k')
+
+    def test_other_schemes_are_rejected(self):
+        for key in ('http://169.254.169.254/latest', 'https://example.com/x', 'file:///etc/passwd',
+                    'tcp://127.0.0.1:22', 'FILE:///tmp/out.flv'):
+            with self.subTest(key=key), self.assertRaises(StreamError):
+                resolve_output_url('Custom RTMP', key)
+
+    def test_file_keys_without_a_url_never_name_a_file(self):
+        with self.assertRaises(StreamError):
+            resolve_output_url('Custom RTMP', 'file:/etc/passwd')
+        # For a platform the key only ever becomes part of its RTMP URL
+        self.assertTrue(resolve_output_url('YouTube', 'file:/etc/passwd').startswith('rtmp://a.rtmp.youtube.com/'))
+
+    def test_file_paths_need_the_operator_flag(self):
+        with mock.patch.object(streaming_engine, 'ALLOW_FILE_OUTPUT', False), self.assertRaises(StreamError):
+            resolve_output_url('Custom RTMP', '/tmp/out.flv')
+
+    def test_malformed_urls(self):
+        for key in ('rtmp://host:99999/live/k', 'rtmp:///live/k', 'rtmp://[::1/live/k'):
+            with self.subTest(key=key), self.assertRaises(StreamError):
+                resolve_output_url('Custom RTMP', key)
+
+
+class TeeTest(unittest.TestCase):
+
+    def test_special_characters_are_escaped(self):
+        self.assertEqual(
+            tee_target(['rtmp://a.example.com/live/k|1', 'rtmp://b.example.com/app/[x]\\y']),
+            '[f=flv:onfail=ignore]rtmp://a.example.com/live/k\\|1|'
+            '[f=flv:onfail=ignore]rtmp://b.example.com/app/\\[x\\]\\\\y'
+        )
+
+    def test_several_outputs_use_the_tee_muxer(self):
+        urls = ['rtmp://a.example.com/live/1', 'rtmp://b.example.com/live/2']
+        args = build_ffmpeg_args('/in.mp4', urls)
+        self.assertEqual(args[-3:], ['-f', 'tee', tee_target(urls)])
+        self.assertIn('0:a?', args)
+        self.assertNotIn('+global_header', args)
+        self.assertIn('+global_header', build_ffmpeg_args('/in.mp4', urls, mode='transcode'))
+
+    def test_single_output_list_is_plain_flv(self):
+        args = build_ffmpeg_args('/in.mp4', ['rtmp://a.example.com/live/1'])
+        self.assertEqual(args[-3:], ['-f', 'flv', 'rtmp://a.example.com/live/1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
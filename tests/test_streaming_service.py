@@ -0,0 +1,135 @@
+"""StreamingService against a fake ffmpeg and a temporary database.
+
+Run with: python -m pytest
+"""
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+
+from benchmarks.control_plane import FAKE_ENCODER
+from database import StorageEngine
+from migrations import migrate_storage
+from query_cache import QueryCache
+from stream_logs import RATE_BURST
+from streaming_engine import MAX_LOG_LINES, StreamError, StreamingEngine, find_orphans
+from streaming_service import StreamingService
+
+# The fake encoder, opening with a burst of stderr lines
+NOISY_ENCODER = FAKE_ENCODER.replace('i=0\n', 'for n in $(seq 150); do echo "line $n" >&2; done\ni=0\n', 1)
+
+
+class ServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        ffmpeg = self.script('ffmpeg', FAKE_ENCODER)
+        input_path = os.path.join(self._tmp.name, 'input.mp4')
+        with open(input_path, 'wb') as f:
+            f.write(b'\0' * 1024)
+
+        self.storage = StorageEngine(os.path.join(self._tmp.name, 'service.db'))
+        migrate_storage(self.storage)
+        self.storage.execute("INSERT INTO users (username, email, password_hash) VALUES ('u', 'u@example.com', 'x')")
+        # Probed as H.264/AAC 720p with 2 s keyframes: a stream copy
+        self.storage.execute(
+            "INSERT INTO videos (user_id, filename, original_name, file_path, resolution, bitrate, fps, "
+            "video_codec, audio_codec, keyframe_interval, duration) "
+            "VALUES (1, 'input.mp4', 'input.mp4', ?, '1280x720', 2000, '30', 'h264', 'aac', 2, 60)",
+            (input_path,)
+        )
+        self.stream_id = self.storage.execute(
+            "INSERT INTO streams (user_id, video_id, title, platform, stream_key) "
+            "VALUES (1, 1, 'test', 'Custom RTMP', 'rtmp://127.0.0.1/live/test')"
+        ).lastrowid
+        self.service = StreamingService(self.storage, QueryCache(), engine=StreamingEngine(ffmpeg))
+
+    def tearDown(self):
+        self.service.shutdown(5)
+        self.service.engine.close(timeout=5)
+        self.storage.close()
+        self._tmp.cleanup()
+
+    def script(self, name, body):
+        path = os.path.join(self._tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(body)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        return path
+
+    def status(self):
+        return self.storage.fetchone("SELECT status FROM streams WHERE id = ?", (self.stream_id,))[0]
+
+    def running_keys(self):
+        return sorted(key for _, _, key in find_orphans(self.service.engine.instance))
+
+    def assertStillLive(self):
+        self.assertEqual(self.status(), 'active')
+        self.assertTrue(self.service.supervisor.is_supervised(self.stream_id))
+        self.assertEqual(self.service.capacity.stats()['outputs'], 1)
+        self.assertEqual(self.running_keys(), [self.stream_id])
+
+
+class StartStreamTest(ServiceTestCase):
+
+    def test_concurrent_starts_launch_once(self):
+        starters = 8
+        barrier = threading.Barrier(starters)
+        results = []
+
+        def start():
+            barrier.wait()
+            try:
+                results.append(self.service.start_stream(self.stream_id))
+            except StreamError as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=start) for _ in range(starters)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(len([result for result in results if isinstance(result, StreamError)]), starters - 1)
+        self.assertStillLive()
+
+    def test_second_start_leaves_the_live_stream_alone(self):
+        self.assertTrue(self.service.start_stream(self.stream_id))
+        with self.assertRaises(StreamError):
+            self.service.start_stream(self.stream_id)
+        with self.assertRaises(StreamError):
+            self.service.supervisor.launch(self.stream_id, '/dev/null', 'rtmp://127.0.0.1/live/other')
+        self.assertStillLive()
+
+        self.service.stop_process(self.stream_id)
+        self.assertEqual(self.running_keys(), [])
+        self.assertFalse(self.service.supervisor.is_supervised(self.stream_id))
+
+
+class StreamLogsTest(ServiceTestCase):
+
+    def test_running_stream_shows_the_unthrottled_ring(self):
+        self.service.engine.ffmpeg_path = self.script('noisy-ffmpeg', NOISY_ENCODER)
+        self.service.start_stream(self.stream_id)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            lines = self.service.stream_logs(self.stream_id)
+            if lines and lines[-1][1] == 'line 150':
+                break
+            time.sleep(0.05)
+        self.assertEqual(len(lines), MAX_LOG_LINES)
+        self.assertEqual(lines[0][1], f'line {151 - MAX_LOG_LINES}')
+
+        # Stopped, the rate-limited copy in the database is what is left
+        self.service.stop_process(self.stream_id)
+        self.service.logs.flush()
+        persisted = self.service.stream_logs(self.stream_id)
+        self.assertTrue(persisted)
+        self.assertLessEqual(len(persisted), RATE_BURST + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Uploaded videos are written here, outside the repo's tracked files
+UPLOAD_DIR = os.environ.get(
+    'STREAMFLOW_UPLOAD_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+)
+CHUNK_SIZE = 1024 * 1024
+LOCK_STRIPES = 64
+# Bytes read ahead of a stream start: container header, and a trailing
+# moov atom for MP4 files written without faststart
+WARM_HEAD_BYTES = 8 * 1024 * 1024
+WARM_TAIL_BYTES = 2 * 1024 * 1024
+
+
+def hash_source(source, chunk_size=CHUNK_SIZE):
+    """SHA-256 and size of a file-like object, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter_chunks(source, memoryview(bytearray(chunk_size))):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def write_file(source, file_path, chunk_size=CHUNK_SIZE):
+    """Stream a file-like object to file_path in fixed-size chunks.
+
+    The content is hashed as it is written, into a temp file in the target
+    directory that is fsynced and renamed into place, so a crash never
+    leaves a partial video under its final name. Returns (size, sha256_hex).
+    """
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter_chunks(source, memoryview(bytearray(chunk_size))):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        remove_file(temp_path)
+        raise
+    return size, digest.hexdigest()
+
+
+def iter_chunks(source, view):
+    """Yield views of successive chunks, reusing one buffer when possible"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    readinto = getattr(source, 'readinto', None)
+    while True:
+        if readinto is not None:
+            count = readinto(view)
+            if not count:
+                return
+            yield view[:count]
+        else:
+            chunk = source.read(len(view))
+            if not chunk:
+                return
+            yield chunk
+
+
+def warm_file(file_path, head=WARM_HEAD_BYTES, tail=WARM_TAIL_BYTES):
+    """Read a video's header and tail into the page cache; returns its size.
+
+    Raises OSError when the file is missing or unreadable, which doubles as
+    the pre-start validation.
+    """
+    view = memoryview(bytearray(CHUNK_SIZE))
+    with open(file_path, 'rb') as source:
+        size = os.fstat(source.fileno()).st_size
+        for offset, length in ((0, head), (max(head, size - tail), tail)):
+            source.seek(offset)
+            remaining = length
+            while remaining > 0:
+                count = source.readinto(view[:min(remaining, CHUNK_SIZE)])
+                if not count:
+                    break
+                remaining -= count
+        if hasattr(os, 'posix_fadvise'):
+            # Let the kernel keep reading ahead from the start
+            os.posix_fadvise(source.fileno(), 0, head * 4, os.POSIX_FADV_WILLNEED)
+    return size
+
+
+def remove_file(file_path):
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+
+
+class BlobStore:
+    """Content-addressed, reference-counted storage for uploaded videos.
+
+    Each distinct file is stored once under its SHA-256 and tracked in the
+    video_blobs table. Uploads are hashed from the in-memory upload buffer
+    before anything is written, so a duplicate costs no disk space and no
+    write I/O, only a ref_count increment. The file is unlinked when the
+    last video row that references it is deleted.
+    """
+
+    def __init__(self, storage, root=None):
+        self.storage = storage
+        self.root = root or os.path.join(UPLOAD_DIR, 'blobs')
+        # Serializes store/release of the same checksum without a global lock
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def blob_path(self, checksum, original_name):
+        ext = os.path.splitext(original_name)[1].lower()
+        return os.path.join(self.root, checksum[:2], f"{checksum}{ext}")
+
+    @contextmanager
+    def _locked(self, checksum):
+        with self._locks[int(checksum[:8], 16) % LOCK_STRIPES]:
+            yield
+
+    def store(self, source, original_name, checksum, size, insert_video):
+        """Reference (or first write) the blob for an upload.
+
+        insert_video(conn, file_path) adds the videos row inside the same
+        transaction as the ref_count increment. Returns (file_path, is_new).
+        """
+        with self._locked(checksum):
+            row = self.storage.fetchone(
+                "SELECT file_path FROM video_blobs WHERE checksum = ?", (checksum,)
+            )
+            if row is not None and os.path.exists(row[0]):
+                file_path, is_new = row[0], False
+            else:
+                file_path, is_new = self.blob_path(checksum, original_name), True
+                write_file(source, file_path)
+            try:
+                with self.storage.writer() as conn:
+                    conn.execute(
+                        "INSERT INTO video_blobs (checksum, file_path, file_size, ref_count) VALUES (?, ?, ?, 1) "
+                        "ON CONFLICT (checksum) DO UPDATE SET ref_count = ref_count + 1, file_path = excluded.file_path",
+                        (checksum, file_path, size)
+                    )
+                    insert_video(conn, file_path)
+            except BaseException:
+                if is_new and row is None:
+                    remove_file(file_path)
+                raise
+        return file_path, is_new
+
+    def release(self, checksum, file_path, delete_video):
+        """Drop one reference; unlink the file when no video uses it any more.
+
+        delete_video(conn) removes the videos row in the same transaction and
+        returns False if there was nothing to delete. The blob's renditions
+        go with it. Videos stored before the blob table existed have no blob
+        row and are unlinked directly.
+        """
+        if checksum is None:
+            with self.storage.writer() as conn:
+                deleted = delete_video(conn)
+            if deleted:
+                remove_file(file_path)
+            return deleted
+
+        with self._locked(checksum):
+            unlink_path = None
+            unlink_renditions = []
+            with self.storage.writer() as conn:
+                if not delete_video(conn):
+                    return False
+                row = conn.execute(
+                    "SELECT file_path, ref_count FROM video_blobs WHERE checksum = ?", (checksum,)
+                ).fetchone()
+                if row is None:
+                    unlink_path = file_path
+                elif row[1] <= 1:
+                    conn.execute("DELETE FROM video_blobs WHERE checksum = ?", (checksum,))
+                    unlink_path = row[0]
+                    unlink_renditions = [
+                        rendition[0] for rendition in conn.execute(
+                            "DELETE FROM renditions WHERE checksum = ? RETURNING file_path", (checksum,)
+                        ).fetchall()
+                    ]
+                else:
+                    conn.execute(
+                        "UPDATE video_blobs SET ref_count = ref_count - 1 WHERE checksum = ?", (checksum,)
+                    )
+            if unlink_path:
+                remove_file(unlink_path)
+            for rendition_path in unlink_renditions:
+                remove_file(rendition_path)
+        return True
+
+    def stats(self):
+        """Logical vs physical bytes, to show what deduplication saves"""
+        row = self.storage.fetchone(
+            "SELECT COALESCE(SUM(file_size * ref_count), 0), COALESCE(SUM(file_size), 0), COUNT(*) FROM video_blobs"
+        )
+        return {'logical_bytes': row[0], 'stored_bytes': row[1], 'blobs': row[2]}